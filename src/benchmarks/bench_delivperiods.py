@@ -0,0 +1,82 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dqnroute.delivperiods import create_periods
+
+aggr_names = ['count', 'sum', 'min', 'max']
+
+
+# Прежняя реализация: чтение и запись строки DataFrame на каждую доставку
+class PandasPeriods:
+    def __init__(self, period_dur):
+        self.periods = pd.DataFrame(columns=['time'] + aggr_names)
+        self.period_dur = period_dur
+
+    def register(self, start_time, cur_time):
+        deliv_time = cur_time - start_time
+        period_num = start_time // self.period_dur
+
+        try:
+            count, total, low, high = self.periods.loc[period_num,
+                                                       aggr_names]
+            row = [count + 1, total + deliv_time,
+                   min(low, deliv_time), max(high, deliv_time)]
+        except KeyError:
+            row = [1, deliv_time, deliv_time, deliv_time]
+
+        self.periods.loc[period_num] = [period_num * self.period_dur] + row
+
+
+def gen_deliveries(num, pkg_delay, seed):
+    rng = np.random.default_rng(seed)
+    start_times = np.arange(num) * pkg_delay
+    deliv_times = rng.exponential(50, num)
+    return list(zip(start_times.tolist(),
+                    (start_times + deliv_times).tolist()))
+
+
+def measure(periods, deliveries):
+    start = time.perf_counter()
+    for start_time, cur_time in deliveries:
+        periods.register(start_time, cur_time)
+    reg_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if isinstance(periods, PandasPeriods):
+        periods.periods.sort_index()
+    else:
+        periods.get_periods()
+    get_time = time.perf_counter() - start
+
+    return reg_time, get_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Per-registration cost of DelivPeriods')
+    parser.add_argument('--num', type=int, default=10**6,
+                        help='Number of deliveries')
+    parser.add_argument('--pandas-num', type=int, default=10**4,
+                        help='Number of deliveries for the pandas reference')
+    parser.add_argument('--period-dur', type=int, default=500)
+    parser.add_argument('--pkg-delay', type=int, default=12)
+    args = parser.parse_args()
+
+    runs = [
+        ('pandas', PandasPeriods(args.period_dur), args.pandas_num),
+        ('columnar', create_periods(args.period_dur, aggr_names), args.num)
+    ]
+
+    for name, periods, num in runs:
+        deliveries = gen_deliveries(num, args.pkg_delay, 42)
+        reg_time, get_time = measure(periods, deliveries)
+        print(f'{name:>9}: {num} deliveries, '
+              f'{reg_time / num * 1e6:.2f} us/registration, '
+              f'get_periods {get_time * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import time
+import argparse
+import warnings
+
+import yaml
+
+from dqnroute import delivperiods, get_network_env_class
+
+
+# Замер времени маршрутизации каждого роутера
+class RouteTimer:
+    def __init__(self, route):
+        self.route = route
+        self.calls = 0
+        self.total = 0
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        res = self.route(*args)
+        self.total += time.perf_counter() - start
+        self.calls += 1
+        return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DQNRouter per-hop cost')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--router', type=str, default='dqn')
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    periods = delivperiods.create_periods(500, ['count', 'sum'])
+    net_env = get_network_env_class(args.kernel)(run_params=run_params,
+                                                 router_type=args.router,
+                                                 deliv_periods=periods)
+
+    timers = []
+    for _, router_env in net_env.graph.nodes.data('router_env'):
+        timer = RouteTimer(router_env.handler.route)
+        router_env.handler.route = timer
+        timers.append(timer)
+
+    start = time.perf_counter()
+    net_env.run(args.seed)
+    wall = time.perf_counter() - start
+
+    calls = sum(timer.calls for timer in timers)
+    total = sum(timer.total for timer in timers)
+    print(f'{calls} hops, {total / calls * 1e6:.1f} us/hop in route, '
+          f'{total:.2f} s of {wall:.2f} s total')
+
+
+if __name__ == '__main__':
+    main()
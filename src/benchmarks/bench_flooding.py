@@ -0,0 +1,126 @@
+import time
+import random
+import argparse
+import warnings
+
+from dqnroute import delivperiods, get_network_env_class, scenarios
+from dqnroute.agents import MsgHandler, LinkStateRouter
+from dqnroute.messages import InMsg, StateAnnounMsg
+
+# Рассылка анонсов link-state с таймером удержания и без: сколько анонсов
+# создано, получено и применено роутерами (раньше network_changed
+# вызывался на каждый примененный анонс), сколько раз вызван
+# network_changed и когда применен последний анонс (время симуляции). В
+# конце все линки восстановлены, графы роутеров сравниваются с графом сети.
+
+
+class Stats:
+    def __init__(self):
+        self.announs = set()
+        self.handled = 0
+        self.applied = 0
+        self.changed = 0
+        self.last_announ = 0
+
+
+def graph_edges(graph):
+    return {(u, v, data['weight']) for u, v, data in graph.edges(data=True)}
+
+
+def run(run_params, router_type, kernel, seed):
+    stats = Stats()
+    handle = MsgHandler.handle
+    network_changed = LinkStateRouter.network_changed
+
+    def counted_handle(router, msg):
+        if not isinstance(msg, InMsg) or \
+                not isinstance(msg.inner_msg, StateAnnounMsg):
+            return handle(router, msg)
+
+        node = msg.inner_msg.node
+        seq = router.announs.get(node)
+        resp = handle(router, msg)
+
+        stats.announs.add((node, msg.inner_msg.seq))
+        stats.handled += 1
+        if router.announs.get(node) != seq:
+            stats.applied += 1
+            stats.last_announ = router.get_time()
+        return resp
+
+    def counted_network_changed(router):
+        stats.changed += 1
+
+    MsgHandler.handle = counted_handle
+    LinkStateRouter.network_changed = counted_network_changed
+    try:
+        net_env = get_network_env_class(kernel)(
+                run_params=run_params,
+                router_type=router_type,
+                deliv_periods=delivperiods.create_periods(500, ['count']))
+
+        start = time.perf_counter()
+        net_env.run(seed)
+        wall = time.perf_counter() - start
+    finally:
+        MsgHandler.handle = handle
+        LinkStateRouter.network_changed = network_changed
+
+    expected = graph_edges(net_env.graph)
+    consistent = all(
+            graph_edges(router_env.handler.router_graph) == expected
+            for _, router_env in net_env.graph.nodes.data('router_env'))
+
+    return stats, wall, consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Link-state flooding with hold-down timer')
+    parser.add_argument('--topology', type=str, default='barabasi_albert')
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--storms', type=int, default=5)
+    parser.add_argument('--storm-links', type=int, default=10)
+    parser.add_argument('--hold-down', type=float, nargs='+',
+                        default=[0, 1, 10])
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    graph = scenarios.get_topology(args.topology,
+                                   nodes=args.nodes,
+                                   seed=args.seed)
+
+    # Штормы через каждые 100 единиц времени, между ними идут пакеты
+    rand = random.Random(args.seed)
+    pkg_distr = []
+    for _ in range(args.storms):
+        failures = scenarios.pick_failures(graph, args.storm_links, rand)
+        for action in ['break_link', 'restore_link']:
+            pkg_distr += [{'action': action, 'pause': 0, 'u': u, 'v': v}
+                          for u, v in failures]
+            pkg_distr.append({'num': 50, 'delay': 2})
+
+    print(f'{args.topology}: {len(graph)} nodes, '
+          f'{graph.number_of_edges()} links, {args.storms} storms of '
+          f'{args.storm_links} links')
+
+    for hold_down in args.hold_down:
+        run_params = scenarios.make_launch(graph, pkg_distr, seed=args.seed)
+        run_params['settings']['router']['link_state'] = {
+            'hold_down': hold_down}
+
+        stats, wall, consistent = run(run_params, 'link_state',
+                                      args.kernel, args.seed)
+        print(f'hold_down {hold_down:g}: '
+              f'{len(stats.announs)} announcements, '
+              f'{stats.handled} handled, {stats.applied} applied, '
+              f'{stats.changed} network_changed, '
+              f'last announcement at {stats.last_announ:g}, '
+              f'{wall:.2f} s, consistent: {consistent}')
+
+
+if __name__ == '__main__':
+    main()
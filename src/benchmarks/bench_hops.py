@@ -0,0 +1,127 @@
+import time
+import random
+import argparse
+import warnings
+
+from dqnroute import delivperiods, scenarios
+from dqnroute.messages import InMsg, PkgMsg, ServiceMsg
+from dqnroute.simulation import FastComputerNetEnv, KernelRouterEnv
+
+# Стоимость передачи пакета по линку: таблица линков роутера против
+# прежнего поиска ребра и соседа в подграфе networkx
+
+
+# Прежняя передача: данные ребра и окружение соседа берутся из локального
+# подграфа на каждом шаге
+class SubgraphRouterEnv(KernelRouterEnv):
+    def _edge_transfer(self, args):
+        msg, done = args
+        edge_data = self.local_graph.edges[self.id, msg.to_node]
+        nbr_router_env = self.local_graph.nodes[msg.to_node]['router_env']
+        new_msg = InMsg(msg.from_node, msg.to_node, msg.inner_msg)
+
+        if isinstance(msg.inner_msg, ServiceMsg):
+            nbr_router_env.receive(new_msg)
+            self._complete(done)
+        elif isinstance(msg.inner_msg, PkgMsg):
+            edge_data['resource'].request(
+                    self._edge_granted,
+                    (edge_data, nbr_router_env, new_msg, done))
+
+    def _edge_granted(self, args):
+        edge_data, _, new_msg, _ = args
+        pkg = new_msg.inner_msg.pkg
+        self.env.schedule(self._edge_transferred, args,
+                          delay=pkg.size / edge_data['bandwidth'])
+
+    def _edge_transferred(self, args):
+        edge_data, nbr_router_env, new_msg, done = args
+        edge_data['resource'].release()
+        nbr_router_env.receive(new_msg)
+        self._complete(done)
+
+
+class SubgraphNetEnv(FastComputerNetEnv):
+    router_env_class = SubgraphRouterEnv
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        for node, router_env in self.router_envs.items():
+            router_env.local_graph = self.graph.subgraph(
+                    [node] + list(self.graph.successors(node)))
+
+
+def bench_lookups(net_env, num, seed):
+    rand = random.Random(seed)
+    edges = list(net_env.graph.edges)
+    pairs = [rand.choice(edges) for _ in range(num)]
+    local_graphs = {node: net_env.graph.subgraph(
+                        [node] + list(net_env.graph.successors(node)))
+                    for node in net_env.graph}
+
+    start = time.perf_counter()
+    for u, v in pairs:
+        local_graph = local_graphs[u]
+        local_graph.edges[u, v]['bandwidth']
+        local_graph.nodes[v]['router_env']
+    t_subgraph = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for u, v in pairs:
+        link = net_env.router_envs[u].links[v]
+        link.bandwidth
+        link.peer
+    t_links = time.perf_counter() - start
+
+    return t_subgraph / num, t_links / num
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Per-hop cost: link tables vs networkx subgraph views')
+    parser.add_argument('--rows', type=int, default=20)
+    parser.add_argument('--cols', type=int, default=20)
+    parser.add_argument('--pkgs', type=int, default=5000)
+    parser.add_argument('--router', type=str, default='link_state')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    graph = scenarios.get_topology('grid', rows=args.rows, cols=args.cols)
+    pkg_distr = scenarios.make_traffic(graph, pkgs=args.pkgs, delay=2,
+                                       storms=2, seed=args.seed)
+    run_params = scenarios.make_launch(graph, pkg_distr, seed=args.seed)
+    run_params['settings']['bootstrap'] = True
+
+    results = {}
+    for name, NetEnv in [('subgraph', SubgraphNetEnv),
+                         ('links', FastComputerNetEnv)]:
+        periods = delivperiods.create_periods(500, ['count', 'sum'])
+        net_env = NetEnv(run_params=run_params,
+                         router_type=args.router,
+                         deliv_periods=periods)
+
+        start = time.perf_counter()
+        net_env.run(args.seed)
+        results[name] = (time.perf_counter() - start, net_env.env.processed,
+                         periods.get_periods())
+
+    t_subgraph, t_links = bench_lookups(net_env, 100000, args.seed)
+
+    (wall_subgraph, events, df_subgraph), (wall_links, _, df_links) = \
+        results.values()
+    print(f'grid {args.rows}x{args.cols}: {args.pkgs} packets, '
+          f'{events} events, {args.router}')
+    print(f'  subgraph views: {wall_subgraph:.2f} s, '
+          f'{wall_subgraph / events * 1e6:.2f} us/event, '
+          f'lookup {t_subgraph * 1e6:.2f} us/hop')
+    print(f'     link table: {wall_links:.2f} s, '
+          f'{wall_links / events * 1e6:.2f} us/event, '
+          f'lookup {t_links * 1e6:.2f} us/hop')
+    print(f'same delivery statistics: {df_subgraph.equals(df_links)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import time
+import argparse
+import warnings
+from copy import deepcopy
+
+import yaml
+import numpy as np
+import torch as tch
+
+from dqnroute import delivperiods, get_network_env_class
+from dqnroute.messages import InferenceMsg
+from dqnroute.networks import QNetwork
+from dqnroute.simulation import InferenceService
+
+# Решения о маршруте в секунду: расчет оценок по одному запросу против
+# пакетного расчета InferenceService, где у каждого роутера своя копия
+# модели. Затем -- полные запуски роутера DQN без пакетного расчета и с
+# окнами window: 0 и window > 0.
+
+
+def gen_inputs(model, nodes_num, emb_dim, nbrs_num, amatrix):
+    states = [np.random.rand(nbrs_num, emb_dim) for _ in range(3)]
+    if amatrix:
+        states.append(np.random.randint(0, 2, (nbrs_num, nodes_num ** 2))
+                      .astype(float))
+
+    return model.prepare(*states)
+
+
+# Как DQNRouter без пакетного расчета: один прямой проход на решение
+def predict_single(models, requests):
+    with tch.no_grad():
+        for router, inputs in requests:
+            models[router].forward_input(inputs).numpy()
+
+
+def predict_batched(models, requests, batch):
+    service = InferenceService(lambda delay, fun: None)
+    for i in range(0, len(requests), batch):
+        for router, inputs in requests[i:i+batch]:
+            service.submit(InferenceMsg(models[router], inputs,
+                                        lambda pred: []), None)
+        service.flush()
+
+
+def bench_forward(args):
+    embs = {'name': args.embeddings, 'dim': 4}
+    amatrix = args.embeddings == 'oh'
+    addit_inputs = [{'name': 'amatrix'}] if amatrix else []
+    model = QNetwork(args.nodes, [64, 64], 'relu', embs, addit_inputs)
+    model.eval()
+    models = [deepcopy(model) for _ in range(args.routers)]
+
+    requests = [(i % args.routers,
+                 gen_inputs(model, args.nodes, embs['dim'], args.nbrs,
+                            amatrix))
+                for i in range(args.decisions)]
+
+    print(f'{args.routers} routers, {args.nbrs} neighbours per decision, '
+          f'{model.label}')
+
+    runs = [('single', lambda: predict_single(models, requests))]
+    for batch in args.batches:
+        runs.append((f'flush {batch}',
+                     lambda batch=batch: predict_batched(models, requests,
+                                                         batch)))
+
+    for name, run in runs:
+        wall = min(timed(run) for _ in range(args.repeats))
+        print(f'{name:>10}: {args.decisions / wall:8.0f} decisions/s')
+
+
+def timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+# Полный запуск. Решение о маршруте регистрирует пакет для награды
+# (register_recent_pkg), по этим вызовам решения и считаются.
+def run_launch(run_params, router, kernel, seed):
+    periods = delivperiods.create_periods(
+            run_params['settings']['period_dur'], ['count', 'sum'])
+    net_env = get_network_env_class(kernel)(run_params=run_params,
+                                            router_type=router,
+                                            deliv_periods=periods)
+
+    decisions = [0]
+    for router_env in net_env.router_envs.values():
+        handler = router_env.handler
+        register = handler.register_recent_pkg
+
+        def counted(*args, register=register):
+            decisions[0] += 1
+            return register(*args)
+
+        handler.register_recent_pkg = counted
+
+    wall = timed(lambda: net_env.run(seed))
+    df = periods.get_periods()
+    return wall, decisions[0], df['sum'].sum() / df['count'].sum()
+
+
+def bench_launch(args):
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    for window in [None, 0] + args.windows:
+        params = deepcopy(run_params)
+        router_cfg = params['settings']['router'][args.router]
+        router_cfg.pop('inference', None)
+        if window is not None:
+            router_cfg['inference'] = {'window': window}
+
+        walls = []
+        for _ in range(args.repeats):
+            wall, decisions, mean_time = run_launch(params, args.router,
+                                                    args.kernel, args.seed)
+            walls.append(wall)
+
+        name = 'inference off' if window is None else f'window {window}'
+        print(f'{name:>14}: {decisions} decisions in {min(walls):.2f} s, '
+              f'{decisions / min(walls):6.0f} decisions/s, '
+              f'mean delivery time {mean_time:.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Route decisions per second, single vs batched')
+    parser.add_argument('launch', type=str, nargs='?',
+                        help='Path to launch file for full runs')
+    parser.add_argument('--router', type=str, default='dqn')
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--windows', type=float, nargs='+', default=[5])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--nodes', type=int, default=10)
+    parser.add_argument('--routers', type=int, default=10)
+    parser.add_argument('--nbrs', type=int, default=3,
+                        help='Neighbours per decision')
+    parser.add_argument('--embeddings', type=str, default='oh',
+                        choices=['oh', 'le'])
+    parser.add_argument('--decisions', type=int, default=20000)
+    parser.add_argument('--batches', type=int, nargs='+',
+                        default=[1, 4, 16, 64])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    bench_forward(args)
+    if args.launch is not None:
+        print()
+        bench_launch(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import time
+import argparse
+
+import yaml
+from simpy.core import EmptySchedule
+
+from dqnroute import delivperiods, get_network_env_class
+
+aggr_names = ['count', 'sum', 'min', 'max']
+
+
+def run_simpy(net_env, seed):
+    # Симуляция по шагам, чтобы посчитать события
+    env = net_env.env
+    env.process(net_env.run_process(seed))
+
+    events = 0
+    try:
+        while True:
+            env.step()
+            events += 1
+    except EmptySchedule:
+        pass
+
+    return events
+
+
+def run_fast(net_env, seed):
+    net_env.run(seed)
+    return net_env.env.processed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='SimPy vs EventKernel simulation speed')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--router', type=str, default='link_state')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    results = {}
+    walls = {}
+    simpy_events = None
+    for kernel, run in [('simpy', run_simpy), ('fast', run_fast)]:
+        periods = delivperiods.create_periods(500, aggr_names)
+        net_env = get_network_env_class(kernel)(run_params=run_params,
+                                                router_type=args.router,
+                                                deliv_periods=periods)
+
+        start = time.perf_counter()
+        events = run(net_env, args.seed)
+        wall = time.perf_counter() - start
+
+        results[kernel] = periods.get_periods()
+        walls[kernel] = wall
+        if simpy_events is None:
+            simpy_events = events
+
+        # Ядро не планирует пустые события, поэтому скорость также
+        # приводится к количеству событий SimPy
+        print(f'{kernel:>5}: {wall:.2f} s, {events} events, '
+              f'{events / wall:.0f} events/s, '
+              f'{simpy_events / wall:.0f} simpy-equivalent events/s')
+
+    print(f'speedup: {walls["simpy"] / walls["fast"]:.2f}x')
+    print('identical statistics:', results['simpy'].equals(results['fast']))
+
+
+if __name__ == '__main__':
+    main()
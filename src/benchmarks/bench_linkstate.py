@@ -0,0 +1,85 @@
+import time
+import random
+import argparse
+
+import networkx as nx
+
+from dqnroute import LinkStateRouter, InMsg, StateAnnounMsg, Package
+
+
+def gen_graph(nodes_num, seed):
+    rand = random.Random(seed)
+    graph = nx.connected_watts_strogatz_graph(nodes_num, 4, 0.1, seed=seed)
+
+    # Маленькие целые веса, чтобы было много путей одной длины
+    router_graph = nx.DiGraph()
+    for u, v in graph.edges:
+        w = rand.choice([1, 2, 3])
+        router_graph.add_edge(u, v, weight=w)
+        router_graph.add_edge(v, u, weight=w)
+
+    return router_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='LinkStateRouter routing with changing topology')
+    parser.add_argument('--nodes', type=int, default=500)
+    parser.add_argument('--pkgs', type=int, default=20000)
+    parser.add_argument('--announ-every', type=int, default=100,
+                        help='Packets between announcements')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rand = random.Random(args.seed)
+    router_graph = gen_graph(args.nodes, args.seed)
+    router = LinkStateRouter(id=0,
+                             get_time=lambda: 0,
+                             router_graph=router_graph)
+    nodes = sorted(router_graph)
+    broken = {}
+    seq = 0
+
+    t_dijkstra = t_table = 0
+    mismatches = 0
+    for i in range(args.pkgs):
+        if i % args.announ_every == 0:
+            # Узел разрывает или восстанавливает одно из своих ребер
+            node = rand.choice(nodes[1:])
+            state = dict(router_graph.adj[node])
+            if node in broken and rand.random() < 0.5:
+                nbr, edge_data = broken.pop(node)
+                state[nbr] = edge_data
+            elif len(state) > 1 and node not in broken:
+                nbr = rand.choice(sorted(state))
+                broken[node] = (nbr, state.pop(nbr))
+
+            seq += 1
+            sender = router.out_nbrs[0]
+            router.handle(InMsg(sender, 0, StateAnnounMsg(node, seq, state)))
+
+        dst = rand.choice(nodes[1:])
+        if not nx.has_path(router_graph, 0, dst):
+            continue
+
+        start = time.perf_counter()
+        expected = nx.dijkstra_path(router_graph, 0, dst)[1]
+        t_dijkstra += time.perf_counter() - start
+
+        pkg = Package(i, 1000, dst, 0, None)
+        start = time.perf_counter()
+        to, _ = router.route(-1, pkg)
+        t_table += time.perf_counter() - start
+
+        mismatches += to != expected
+
+    print(f'{len(router_graph)} nodes, {router_graph.size()} edges, '
+          f'{args.pkgs} packets, {seq} announcements')
+    print(f'nx.dijkstra_path: {t_dijkstra / args.pkgs * 1e6:.1f} us/packet')
+    print(f'   routing table: {t_table / args.pkgs * 1e6:.1f} us/packet')
+    print(f'speedup: {t_dijkstra / t_table:.1f}x, '
+          f'next hop mismatches: {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
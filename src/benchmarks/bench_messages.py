@@ -0,0 +1,179 @@
+import time
+import argparse
+
+from dqnroute import messages
+from dqnroute.messages import *
+from dqnroute.dispatch import Dispatcher, handles
+
+
+# Прежняя реализация: содержимое в словаре, доступ через __getattr__
+class DictMessage:
+    def __init__(self, **kwargs):
+        self.content = kwargs
+
+    def __getattr__(self, name):
+        try:
+            return self.content[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class DictTransferMsg(DictMessage):
+    def __init__(self, from_node, to_node, inner_msg):
+        super().__init__(from_node=from_node,
+                         to_node=to_node,
+                         inner_msg=inner_msg)
+
+
+class DictInMsg(DictTransferMsg):
+    pass
+
+
+class DictOutMsg(DictTransferMsg):
+    pass
+
+
+class DictServiceMsg(DictMessage):
+    pass
+
+
+class DictPkgMsg(DictMessage):
+    def __init__(self, pkg):
+        super().__init__(pkg=pkg)
+
+
+class DictRewardMsg(DictServiceMsg):
+    def __init__(self, pkg_id, estim, reward_data):
+        super().__init__(pkg_id=pkg_id, estim=estim, reward_data=reward_data)
+
+
+dict_msgs = {
+    'InMsg': DictInMsg,
+    'OutMsg': DictOutMsg,
+    'PkgMsg': DictPkgMsg,
+    'RewardMsg': DictRewardMsg,
+    'ServiceMsg': DictServiceMsg,
+    'make_in': lambda msg: DictInMsg(**msg.content)
+}
+
+slotted_msgs = {
+    'InMsg': messages.InMsg,
+    'OutMsg': messages.OutMsg,
+    'PkgMsg': messages.PkgMsg,
+    'RewardMsg': messages.RewardMsg,
+    'ServiceMsg': messages.ServiceMsg,
+    'make_in': lambda msg: messages.InMsg(msg.from_node, msg.to_node,
+                                          msg.inner_msg)
+}
+
+
+# Сообщения одного шага пакета: роутер отправляет пакет и награду,
+# окружение передает их соседям, соседи разбирают входящие сообщения
+def hops(msgs, num):
+    InMsg, OutMsg, PkgMsg = msgs['InMsg'], msgs['OutMsg'], msgs['PkgMsg']
+    RewardMsg, ServiceMsg = msgs['RewardMsg'], msgs['ServiceMsg']
+    make_in = msgs['make_in']
+
+    pkg = Package(1, 1000, 9, 0, None)
+
+    start = time.perf_counter()
+    for i in range(num):
+        out = [OutMsg(1, 2, PkgMsg(pkg)),
+               OutMsg(1, 0, RewardMsg(pkg.id, 10.0, (i, 0)))]
+
+        for msg in out:
+            if isinstance(msg, OutMsg):
+                in_msg = make_in(msg)
+                inner_msg = in_msg.inner_msg
+                sender = in_msg.from_node
+                if isinstance(inner_msg, PkgMsg):
+                    _ = inner_msg.pkg.dst, sender
+                elif isinstance(inner_msg, ServiceMsg):
+                    _ = inner_msg.estim, inner_msg.reward_data, sender
+
+    return (time.perf_counter() - start) / num
+
+
+# Прежний выбор события окружения роутера цепочкой isinstance
+class ChainEnv:
+    def msg_event(self, msg):
+        if isinstance(msg, (InitMsg, AddLinkMsg, RemoveLinkMsg)):
+            return 0
+        elif isinstance(msg, OutMsg):
+            return 1
+        elif isinstance(msg, InMsg):
+            return 2
+        elif isinstance(msg, PkgReceivedMsg):
+            return 3
+        elif isinstance(msg, InferenceMsg):
+            return 4
+        elif isinstance(msg, DelayedMsg):
+            return 5
+        elif isinstance(msg, InterruptDelayMsg):
+            return 6
+        else:
+            raise UnsupportedMsgType(msg)
+
+
+class TableEnv(Dispatcher):
+    def msg_event(self, msg):
+        return self.dispatch_tables['event'][msg.__class__](self, msg)
+
+    @handles('event', InitMsg, AddLinkMsg, RemoveLinkMsg)
+    def router_only_event(self, msg):
+        return 0
+
+    @handles('event', OutMsg)
+    def out_event(self, msg):
+        return 1
+
+    @handles('event', InMsg)
+    def in_event(self, msg):
+        return 2
+
+    @handles('event', PkgReceivedMsg)
+    def received_event(self, msg):
+        return 3
+
+    @handles('event', InferenceMsg)
+    def inference_event(self, msg):
+        return 4
+
+    @handles('event', DelayedMsg)
+    def delayed_event(self, msg):
+        return 5
+
+    @handles('event', InterruptDelayMsg)
+    def interrupt_event(self, msg):
+        return 6
+
+
+def dispatch(env, msgs, num):
+    start = time.perf_counter()
+    for _ in range(num):
+        for msg in msgs:
+            env.msg_event(msg)
+
+    return (time.perf_counter() - start) / num / len(msgs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Message construction and dispatch cost per hop')
+    parser.add_argument('--hops', type=int, default=200000)
+    args = parser.parse_args()
+
+    for name, msgs in [('dict', dict_msgs), ('slots', slotted_msgs)]:
+        print(f'{name:<6} {hops(msgs, args.hops) * 1e6:.2f} us per hop')
+
+    # Сообщения, которые окружение получает на шаге пакета
+    pkg = Package(1, 1000, 9, 0, None)
+    step_msgs = [OutMsg(1, 2, PkgMsg(pkg)), InMsg(1, 2, PkgMsg(pkg)),
+                 PkgReceivedMsg(pkg), DelayedMsg(1, 10, InitMsg({}))]
+    for name, env in [('chain', ChainEnv()), ('table', TableEnv())]:
+        print(f'{name:<6} {dispatch(env, step_msgs, args.hops) * 1e6:.3f} '
+              f'us per msg_event')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import sys
+import time
+import json
+import argparse
+import resource
+import tempfile
+import warnings
+import subprocess
+
+import networkx as nx
+
+from dqnroute import delivperiods, get_network_env_class
+from dqnroute.networks import QNetwork
+import dqnroute.networks.common as common
+
+trainings = ['sync', 'none']
+
+
+def make_run_params(nodes, training):
+    graph = nx.connected_watts_strogatz_graph(nodes, 4, 0.1, seed=1)
+    return {
+        'network': [{'u': u, 'v': v, 'bandwidth': 100}
+                    for u, v in graph.edges],
+        'settings': {
+            'period_dur': 500,
+            'pkg_size': 1000,
+            'pkg_distr': [{'num': 10, 'delay': 12}],
+            'router_env': {'pkg_proc_delay': 5},
+            'router': {
+                'dqn': {
+                    'optimizer': {'name': 'rmsprop', 'lr': 0.001},
+                    'batch_size': 1,
+                    'mem_capacity': 1,
+                    'layers': [64, 64],
+                    'activation': 'relu',
+                    'embeddings': {'name': 'oh'},
+                    'addit_inputs': [{'name': 'amatrix'}],
+                    'training': {'mode': training}
+                }
+            }
+        }
+    }
+
+
+# Создать окружение в отдельном процессе, чтобы измерить его память
+def child(args):
+    warnings.simplefilter('ignore')
+    common.TORCH_MODELS_DIR = args.models_dir
+
+    # Первый оптимизатор импортирует torch._dynamo, это не относится к
+    # роутерам
+    common.optim_class('rmsprop')(QNetwork(2, [1], 'relu', {'name': 'oh'})
+                                  .parameters())
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    net_env = get_network_env_class('fast')(
+            run_params=make_run_params(args.nodes, args.training),
+            router_type='dqn',
+            deliv_periods=delivperiods.create_periods(500, ['count']))
+    startup = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({'startup': startup, 'rss': (rss - rss_before) / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='DQN network startup time and memory')
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--training', type=str)
+    parser.add_argument('--models-dir', type=str)
+    args = parser.parse_args()
+
+    if args.training is not None:
+        return child(args)
+
+    with tempfile.TemporaryDirectory() as models_dir:
+        # Случайная модель нужного размера вместо предобученной
+        common.TORCH_MODELS_DIR = models_dir
+        QNetwork(args.nodes, [64, 64], 'relu', {'name': 'oh'},
+                 [{'name': 'amatrix'}]).save()
+
+        for training in trainings:
+            out = subprocess.run([sys.executable, __file__,
+                                  '--nodes', str(args.nodes),
+                                  '--training', training,
+                                  '--models-dir', models_dir],
+                                 capture_output=True, text=True, check=True)
+            res = json.loads(out.stdout.splitlines()[-1])
+            print(f'training={training:<6} startup {res["startup"]:6.2f} s, '
+                  f'RSS +{res["rss"]:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import time
+import random
+import argparse
+
+import numpy as np
+import networkx as nx
+
+from dqnroute.adjacency import AdjacencyMatrix
+from dqnroute.networks import LENodeEnc, EmbCache
+
+
+# Последовательность топологий: каждый раз разрывается или восстанавливается
+# одно ребро
+def gen_topologies(nodes_num, changes, seed):
+    rand = random.Random(seed)
+    graph = nx.connected_watts_strogatz_graph(nodes_num, 4, 0.1, seed=seed)
+    amatrix = AdjacencyMatrix()
+    for u, v in graph.edges:
+        w = rand.choice([10, 20, 30])
+        amatrix.add_edge(u, v, w)
+        amatrix.add_edge(v, u, w)
+
+    topologies = [amatrix.weights.copy()]
+    broken = []
+    for _ in range(changes):
+        if broken and rand.random() < 0.5:
+            u, v, w = broken.pop(rand.randrange(len(broken)))
+            amatrix.add_edge(u, v, w)
+            amatrix.add_edge(v, u, w)
+        else:
+            u, v = rand.choice(sorted(graph.edges))
+            if amatrix.edges[u, v]:
+                broken.append((u, v, amatrix.weights[u, v]))
+                amatrix.remove_edge(u, v)
+                amatrix.remove_edge(v, u)
+
+        topologies.append(amatrix.weights.copy())
+
+    return topologies
+
+
+def run(topologies, routers, dim, **params):
+    LENodeEnc.cache = EmbCache(256)
+    encs = [LENodeEnc(dim, **params) for _ in range(routers)]
+
+    # Каждый роутер по очереди получает каждую топологию
+    results = []
+    start = time.perf_counter()
+    for weights in topologies:
+        amatrix = AdjacencyMatrix.from_array(weights)
+        for enc in encs:
+            enc.fit(amatrix)
+        results.append(np.array(list(encs[0].embs.values())))
+    wall = time.perf_counter() - start
+
+    return wall / (len(topologies) * routers), results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Laplacian eigenmap fits: cold, cached and warm-started')
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--dim', type=int, default=4)
+    parser.add_argument('--routers', type=int, default=10,
+                        help='Routers fitting every topology')
+    parser.add_argument('--changes', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    topologies = gen_topologies(args.nodes, args.changes, args.seed)
+
+    base = None
+    for name, params in [('cold', {'cache': False}),
+                         ('cached', {}),
+                         ('warm', {'cache': False, 'warm_start': True}),
+                         ('warm+cached', {'warm_start': True})]:
+        per_fit, results = run(topologies, args.routers, args.dim, **params)
+        if base is None:
+            base = results
+
+        # Знаки векторов произвольные, сравниваем по модулю
+        diff = max(np.abs(np.abs(r) - np.abs(b)).max()
+                   for r, b in zip(results, base))
+        print(f'{name:>11}: {per_fit * 1e3:.2f} ms/fit, '
+              f'max |emb| difference from cold: {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import time
+import random
+import argparse
+
+import networkx as nx
+
+from dqnroute import QRouter, InMsg, Package
+from dqnroute.agents.base import MsgHandler, RewardAgent
+from dqnroute.dispatch import handles
+from dqnroute.messages import RewardMsg
+
+
+# Прежняя реализация: Q-таблица из словарей, оценки собираются на каждый
+# пакет
+class DictQRouter(MsgHandler, RewardAgent):
+    def __init__(self, lr, **kwargs):
+        super().__init__(**kwargs)
+        self.lr = lr
+        self.init_estim = 10
+
+        self.Q = {}
+        for d in self.all_nbrs:
+            self.check_dst(d)
+
+    def route(self, sender, pkg):
+        self.check_dst(pkg.dst)
+
+        Qs = self.actual_Q(pkg.dst)
+        next_node, estim = min(Qs.items(), key=lambda x: x[1])
+
+        reward_msg = self.register_recent_pkg(pkg, estim, pkg.dst)
+        return next_node, [reward_msg]
+
+    @handles('inner', RewardMsg)
+    def handle_reward(self, msg, y):
+        estim_new, d = self.receive_reward(msg)
+        estim_delta = estim_new - self.Q[d][y]
+        self.Q[d][y] += estim_delta * self.lr
+
+        return []
+
+    def check_dst(self, d):
+        if d not in self.Q:
+            self.Q[d] = {y: 0 if d == y else self.init_estim
+                         for y in self.out_nbrs}
+
+    def actual_Q(self, d):
+        Qa = {}
+        for n in self.out_nbrs:
+            Qa[n] = self.Q[d][n]
+
+        return Qa
+
+
+def make_graph(topology, nodes):
+    if topology == 'ring':
+        graph = nx.cycle_graph(nodes)
+    else:
+        side = int(nodes ** 0.5)
+        graph = nx.convert_node_labels_to_integers(
+                nx.grid_2d_graph(side, nodes // side))
+
+    return graph.to_directed()
+
+
+def make_routers(Router, graph, clock):
+    routers = {}
+    for node in graph:
+        router_graph = nx.DiGraph()
+        for nbr in graph.successors(node):
+            router_graph.add_edge(node, nbr)
+            router_graph.add_edge(nbr, node)
+
+        routers[node] = Router(lr=0.5,
+                               id=node,
+                               get_time=lambda: clock[0],
+                               router_graph=router_graph)
+
+    return routers
+
+
+# Пакеты идут по выбору роутеров, награда сразу возвращается предыдущему
+# узлу. Вернуть время на шаг и выбранные соседи.
+def run(routers, pkgs, max_hops, clock):
+    hops = []
+    elapsed = 0
+    for pkg_id, (src, dst) in enumerate(pkgs):
+        pkg = Package(pkg_id, 1000, dst, clock[0], None)
+        sender, node = -1, src
+        for _ in range(max_hops):
+            if node == dst:
+                break
+
+            clock[0] += 1
+            start = time.perf_counter()
+            next_node, resp = routers[node].route(sender, pkg)
+            if sender != -1:
+                reward = resp[0]
+                if not isinstance(reward, RewardMsg):
+                    reward = reward.inner_msg
+                routers[sender].handle(InMsg(node, sender, reward))
+            elapsed += time.perf_counter() - start
+
+            hops.append(next_node)
+            sender, node = node, next_node
+
+    return elapsed / len(hops), hops
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Q-routing: old vs current Q-table lookup')
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--pkgs', type=int, default=2000)
+    parser.add_argument('--max-hops', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for topology in ['ring', 'grid']:
+        graph = make_graph(topology, args.nodes)
+        rand = random.Random(args.seed)
+        nodes = list(graph)
+        pkgs = [tuple(rand.sample(nodes, 2)) for _ in range(args.pkgs)]
+
+        results = {}
+        for name, Router in [('old', DictQRouter), ('current', QRouter)]:
+            clock = [0]
+            routers = make_routers(Router, graph, clock)
+            results[name] = run(routers, pkgs, args.max_hops, clock)
+
+        (t_old, hops_old), (t_new, hops_new) = results.values()
+        print(f'{topology}: {len(graph)} nodes, {len(hops_new)} hops, '
+              f'old {t_old * 1e6:.1f} us/hop, '
+              f'current {t_new * 1e6:.1f} us/hop, '
+              f'same choices: {hops_old == hops_new}')
+
+
+if __name__ == '__main__':
+    main()
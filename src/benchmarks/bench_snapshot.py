@@ -0,0 +1,109 @@
+import time
+import random
+import argparse
+import warnings
+from copy import deepcopy
+
+import yaml
+import networkx as nx
+
+from dqnroute import delivperiods, get_network_env_class, snapshot
+
+# Повторное использование прогрева в экспериментах с отказами: каждый
+# вариант обрывает и восстанавливает свой линк после общего прогрева.
+# Варианты запускаются с начала, продолжаются из копий процесса (fork) и
+# из сериализованного снимка. Статистика доставки всех способов должна
+# совпасть.
+
+
+def make_env(run_params, router_type):
+    periods = delivperiods.create_periods(
+            run_params['settings']['period_dur'], ['count', 'sum'])
+    return get_network_env_class('fast')(run_params=run_params,
+                                         router_type=router_type,
+                                         deliv_periods=periods)
+
+
+def make_variants(run_params, warmup_time, num, seed):
+    graph = nx.Graph()
+    graph.add_edges_from((edge['u'], edge['v'])
+                         for edge in run_params['network'])
+    # Обрыв моста разделил бы сеть
+    edges = sorted(set(graph.edges) - set(nx.bridges(graph)))
+
+    rand = random.Random(seed)
+    variants = []
+    for _ in range(num):
+        u, v = rand.choice(edges)
+        broken = warmup_time + rand.uniform(0, 2000)
+        restored = broken + rand.uniform(2000, 8000)
+        variants.append([
+            {'time': broken, 'action': 'break_link', 'u': u, 'v': v},
+            {'time': restored, 'action': 'restore_link', 'u': u, 'v': v}])
+
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Failure variants: fresh runs vs reused warm-up')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--router', type=str, default='q')
+    parser.add_argument('--variants', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=4,
+                        help='Number of pkg_distr segments in warm-up')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    # Отказы задаются вариантами, действия из файла запуска не нужны
+    run_params = deepcopy(run_params)
+    settings = run_params['settings']
+    settings['pkg_distr'] = [seq for seq in settings['pkg_distr']
+                             if 'action' not in seq]
+
+    warmup_time = sum(seq['num'] * seq['delay']
+                      for seq in settings['pkg_distr'][:args.warmup])
+    variants = make_variants(run_params, warmup_time, args.variants,
+                             args.seed)
+    print(f'{args.router}: {len(variants)} variants, warm-up {warmup_time} '
+          f'of {sum(seq["num"] * seq["delay"] for seq in settings["pkg_distr"])}')
+
+    start = time.perf_counter()
+    fresh = []
+    for variant in variants:
+        net_env = make_env(run_params, args.router)
+        net_env.start(args.seed)
+        fresh.append(snapshot.run_variant(net_env, variant))
+    print(f'  fresh runs: {time.perf_counter() - start:.2f} s')
+
+    start = time.perf_counter()
+    net_env = make_env(run_params, args.router)
+    net_env.start(args.seed)
+    net_env.run_until(warmup_time)
+    forked = snapshot.fork_variants(net_env, variants + [[]])
+    print(f'        fork: {time.perf_counter() - start:.2f} s')
+
+    start = time.perf_counter()
+    data = snapshot.snapshot(net_env)
+    restored = [snapshot.run_variant(snapshot.restore(data), variant)
+                for variant in variants]
+    print(f'     restore: {time.perf_counter() - start:.2f} s '
+          f'(snapshot {len(data) / 2**20:.1f} MB)')
+
+    full_env = make_env(run_params, args.router)
+    full_env.run(args.seed)
+    full = full_env.deliv_periods.get_periods()
+
+    same = all(df.equals(fresh_df) and restored_df.equals(fresh_df)
+               for df, restored_df, fresh_df in zip(forked, restored, fresh))
+    print(f'same delivery statistics: {same}')
+    print(f'no actions equals uninterrupted run: {forked[-1].equals(full)}')
+
+
+if __name__ == '__main__':
+    main()
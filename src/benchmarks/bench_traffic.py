@@ -0,0 +1,85 @@
+import os
+import time
+import argparse
+import tempfile
+from copy import deepcopy
+
+from dqnroute import delivperiods, get_network_env_class, scenarios, traffic
+
+# Стоимость генерации трафика: прежний run_process (random.choice и
+# timeout на каждый пакет) против расписания, подготовленного заранее, и
+# трейса из файла. Роутеры не обрабатывают пакеты, окружение только
+# отправляет их, поэтому измеряется сама генерация.
+
+
+def drive(run_params, kernel, seed):
+    net_env = get_network_env_class(kernel)(
+            run_params=run_params,
+            router_type='link_state',
+            deliv_periods=delivperiods.create_periods(500, ['count']))
+
+    sent = 0
+
+    def receive(msg):
+        nonlocal sent
+        sent += 1
+
+    for router_env in net_env.router_envs.values():
+        router_env.receive = receive
+
+    start = time.perf_counter()
+    net_env.run(seed)
+    return time.perf_counter() - start, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Traffic generation: per-package RNG vs compiled schedule')
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--pkgs', type=int, default=10**6)
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    graph = scenarios.get_topology('barabasi_albert',
+                                   nodes=args.nodes,
+                                   seed=args.seed)
+    pkg_distr = scenarios.make_traffic(graph, pkgs=args.pkgs, storms=5,
+                                       seed=args.seed)
+    run_params = scenarios.make_launch(graph, pkg_distr, seed=args.seed)
+    print(f'{args.nodes} nodes, {args.pkgs} packets, {args.kernel} kernel')
+
+    wall, sent = drive(run_params, args.kernel, args.seed)
+    print(f'      per-package: {wall:.2f} s, {sent} messages')
+
+    start = time.perf_counter()
+    schedule = traffic.compile_schedule(pkg_distr, sorted(graph),
+                                        run_params['settings']['pkg_size'],
+                                        args.seed)
+    print(f'          compile: {time.perf_counter() - start:.2f} s')
+
+    compiled_params = deepcopy(run_params)
+    compiled_params['settings']['traffic'] = {'mode': 'compiled'}
+    wall, sent = drive(compiled_params, args.kernel, args.seed)
+    print(f'compiled schedule: {wall:.2f} s, {sent} messages '
+          f'(including compile)')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for ext in ['csv', 'npy']:
+            path = os.path.join(tmp_dir, 'trace.' + ext)
+            traffic.save_trace(schedule, path)
+
+            start = time.perf_counter()
+            traffic.load_trace(path, sorted(graph))
+            load = time.perf_counter() - start
+
+            trace_params = deepcopy(run_params)
+            trace_params['settings']['traffic'] = {'mode': 'trace',
+                                                   'path': path}
+            wall, sent = drive(trace_params, args.kernel, args.seed)
+            print(f'        {ext} trace: {wall:.2f} s, {sent} messages '
+                  f'(load {load:.2f} s)')
+
+
+if __name__ == '__main__':
+    main()
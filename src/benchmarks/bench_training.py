@@ -0,0 +1,62 @@
+import time
+import argparse
+import warnings
+
+import yaml
+
+from dqnroute import delivperiods, get_network_env_class
+
+trainings = [
+    {'mode': 'sync'},
+    {'mode': 'deferred', 'every': 4},
+    {'mode': 'deferred', 'every': 16, 'steps': 4},
+    {'mode': 'deferred', 'period': 200},
+    {'mode': 'background'},
+    {'mode': 'background', 'sync_every': 4}
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='DQN training schedules: speed vs delivery time')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--router', type=str, default='dqn_le')
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--mem-capacity', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    for training in trainings:
+        with open(args.launch) as f:
+            run_params = yaml.safe_load(f)
+
+        router_cfg = run_params['settings']['router'][args.router]
+        router_cfg['training'] = training
+        if args.batch_size is not None:
+            router_cfg['batch_size'] = args.batch_size
+        if args.mem_capacity is not None:
+            router_cfg['mem_capacity'] = args.mem_capacity
+
+        periods = delivperiods.create_periods(
+                run_params['settings']['period_dur'], ['count', 'sum'])
+        net_env = get_network_env_class(args.kernel)(run_params=run_params,
+                                                     router_type=args.router,
+                                                     deliv_periods=periods)
+
+        start = time.perf_counter()
+        net_env.run(args.seed)
+        wall = time.perf_counter() - start
+
+        df = periods.get_periods()
+        avg = df['sum'] / df['count']
+        name = ', '.join(f'{k}={v}' for k, v in training.items())
+        print(f'{name:<32} {df["count"].sum() / wall:7.1f} pkgs/s, '
+              f'mean delivery time {df["sum"].sum() / df["count"].sum():.1f},'
+              f' last period {avg.iloc[-1]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
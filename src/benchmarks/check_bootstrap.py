@@ -0,0 +1,120 @@
+import time
+import argparse
+import warnings
+from copy import deepcopy
+
+import yaml
+import numpy as np
+
+from dqnroute import delivperiods, get_network_env_class
+from dqnroute.agents import LinkStateRouter
+from dqnroute.messages import Package
+
+# Проверка запуска с bootstrap: после InitMsg состояние каждого роутера
+# link-state (ребра узлов в том же порядке, матрица смежности, номера
+# анонсов, следующие узлы до всех узлов, эмбеддинги DQN) должно совпадать
+# с состоянием после рассылки начальных анонсов. Затем обе симуляции
+# проходят целиком, статистика доставки должна совпасть.
+
+
+class StateMismatch(Exception):
+    pass
+
+
+def make_env(run_params, router_type, kernel, bootstrap, pkgs=True):
+    run_params = deepcopy(run_params)
+    run_params['settings']['bootstrap'] = bootstrap
+    if not pkgs:
+        run_params['settings']['pkg_distr'] = []
+
+    periods = delivperiods.create_periods(500, ['count', 'sum'])
+    net_env = get_network_env_class(kernel)(run_params=run_params,
+                                            router_type=router_type,
+                                            deliv_periods=periods)
+    return net_env, periods
+
+
+def router_state(router):
+    graph = router.router_graph
+    nodes = sorted(graph)
+
+    state = {
+        'rows': [(u, list(graph.adj[u].items())) for u in nodes],
+        'preds': [(u, sorted(graph.pred[u])) for u in nodes],
+        'out_nbrs': router.out_nbrs,
+        'amatrix nodes': router.adjacency.nodes,
+        'announs': sorted(router.announs.items()),
+        'seq_num': router.seq_num,
+        'next nodes': [
+            LinkStateRouter.route(router, -1, Package(0, 0, dst, 0, None))[0]
+            for dst in nodes if dst != router.id]
+    }
+
+    router.check_network()
+    arrays = {'amatrix': router.adjacency.weights}
+    if hasattr(router, 'node_enc'):
+        arrays['embeddings'] = np.array(
+                [router.node_enc.encode(node) for node in nodes])
+
+    return state, arrays
+
+
+def compare(flooded, bootstrapped):
+    for (_, flooded_env), (_, boot_env) in zip(
+            flooded.graph.nodes.data('router_env'),
+            bootstrapped.graph.nodes.data('router_env')):
+        node = flooded_env.id
+        state, arrays = router_state(flooded_env.handler)
+        boot_state, boot_arrays = router_state(boot_env.handler)
+
+        for name, value in state.items():
+            if boot_state[name] != value:
+                raise StateMismatch(f'Router {node}: {name} differs')
+        for name, value in arrays.items():
+            if not np.array_equal(boot_arrays[name], value):
+                raise StateMismatch(f'Router {node}: {name} differs')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check bootstrap startup against flooded startup')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--routers', type=str, nargs='+',
+                        default=['link_state', 'dqn', 'dqn_le'])
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    for router_type in args.routers:
+        envs = []
+        for bootstrap in [False, True]:
+            net_env, _ = make_env(run_params, router_type, args.kernel,
+                                  bootstrap, pkgs=False)
+
+            start = time.perf_counter()
+            net_env.run(args.seed)
+            print(f'{router_type}: startup with bootstrap={bootstrap} '
+                  f'{time.perf_counter() - start:.2f} s')
+            envs.append(net_env)
+
+        compare(*envs)
+        print(f'{router_type}: router states equal')
+
+        results = []
+        for bootstrap in [False, True]:
+            net_env, periods = make_env(run_params, router_type, args.kernel,
+                                        bootstrap)
+            net_env.run(args.seed)
+            results.append(periods.get_periods())
+
+        same = results[0].equals(results[1])
+        print(f'{router_type}: delivery statistics equal: {same}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import math
+import argparse
+import warnings
+
+import yaml
+
+from dqnroute import delivperiods, get_network_env_class
+
+# Проверка кэша соседей роутеров: после событий каждого момента времени
+# out_nbrs, in_nbrs, all_nbrs и sorted_out_nbrs должны совпадать с
+# кортежами, построенными по графу роутера заново. Сценарий с разрывами и
+# восстановлением линков берется из файла запуска. Симуляция идет на ядре
+# fast по шагам (run_until), роутеры не подменяются.
+
+
+def check(router):
+    graph = router.router_graph
+    out_nbrs = tuple(nbr for _, nbr in graph.out_edges(router.id))
+    in_nbrs = tuple(nbr for nbr, _ in graph.in_edges(router.id))
+
+    expected = {'out_nbrs': out_nbrs,
+                'in_nbrs': in_nbrs,
+                'all_nbrs': in_nbrs + out_nbrs,
+                'sorted_out_nbrs': tuple(sorted(out_nbrs))}
+    for name, value in expected.items():
+        cached = getattr(router, name)
+        assert cached == value, \
+            f'Router {router.id}: {name} {cached} != {value}'
+        assert isinstance(cached, tuple), \
+            f'Router {router.id}: {name} is {type(cached).__name__}'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check cached neighbour lists during a simulation')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--routers', type=str, nargs='+',
+                        default=['link_state', 'q', 'dqn'])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    for router_type in args.routers:
+        net_env = get_network_env_class('fast')(
+                run_params=run_params,
+                router_type=router_type,
+                deliv_periods=delivperiods.create_periods(500, ['count']))
+        routers = [router_env.handler
+                   for router_env in net_env.router_envs.values()]
+
+        net_env.start(args.seed)
+        queue = net_env.env.queue
+        steps = 0
+        while queue:
+            net_env.run_until(math.nextafter(queue[0][0], math.inf))
+            for router in routers:
+                check(router)
+            steps += 1
+        net_env.close()
+
+        print(f'{router_type}: {steps} steps, neighbours consistent')
+
+
+if __name__ == '__main__':
+    main()
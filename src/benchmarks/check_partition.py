@@ -0,0 +1,78 @@
+import argparse
+import warnings
+
+from dqnroute import delivperiods, get_network_env_class
+
+# Проверка анонсов link-state после разделения сети: пока часть сети
+# отрезана, она пропускает анонсы изменений другой части. После
+# восстановления линка граф каждого роутера должен совпасть с сетью, а
+# отложенных анонсов не должно остаться.
+
+EDGES = [(0, 1), (1, 2), (2, 3), (2, 4), (3, 4), (3, 5), (4, 5)]
+
+ACTIONS = [('break_link', 1, 2),
+           ('break_link', 3, 4),
+           ('restore_link', 1, 2),
+           ('break_link', 3, 5)]
+
+
+def make_launch():
+    pkg_distr = [{'num': 20, 'delay': 12}]
+    for action, u, v in ACTIONS:
+        pkg_distr.append({'action': action, 'pause': 20, 'u': u, 'v': v})
+        # Пакеты только внутри большей части сети, пока она отрезана
+        pkg_distr.append({'num': 20, 'delay': 12,
+                          'srcs': [2, 3, 4, 5], 'dsts': [2, 3, 4, 5]})
+
+    return {
+        'network': [{'u': u, 'v': v, 'bandwidth': 100} for u, v in EDGES],
+        'settings': {
+            'period_dur': 500,
+            'pkg_size': 1000,
+            'pkg_distr': pkg_distr,
+            'router_env': {'pkg_proc_delay': 5},
+            'router': {'link_state': {}}
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check link-state routers after a network partition')
+    parser.add_argument('--kernels', type=str, nargs='+',
+                        default=['fast', 'simpy'])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    edges = set(EDGES)
+    for action, u, v in ACTIONS:
+        if action == 'break_link':
+            edges.discard((u, v))
+        else:
+            edges.add((u, v))
+    expected = edges | {(v, u) for u, v in edges}
+
+    for kernel in args.kernels:
+        net_env = get_network_env_class(kernel)(
+                run_params=make_launch(),
+                router_type='link_state',
+                deliv_periods=delivperiods.create_periods(500, ['count']))
+        net_env.run(args.seed)
+
+        for node, router_env in net_env.router_envs.items():
+            router = router_env.handler
+            edges = set(router.router_graph.edges)
+            assert edges == expected, \
+                (f'{kernel}: router {node} has stale edges '
+                 f'{sorted(edges - expected)}, misses '
+                 f'{sorted(expected - edges)}')
+            assert not router.pending_announs, \
+                f'{kernel}: router {node} keeps pending announcements'
+
+        print(f'{kernel}: router graphs match the network')
+
+
+if __name__ == '__main__':
+    main()
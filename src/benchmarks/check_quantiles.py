@@ -0,0 +1,92 @@
+import argparse
+
+import numpy as np
+
+from dqnroute.delivperiods import create_periods, merge_periods
+
+# Проверка квантилей и объединения интервалов. Времена доставки нескольких
+# запусков регистрируются по отдельности и в одних общих интервалах:
+# merge_periods должен дать ту же таблицу, а квантили по гистограмме --
+# отличаться от точных не больше чем на rel_acc.
+
+AGGR_NAMES = ['count', 'sum', 'min', 'max', 'hist',
+              'p0', 'p50', 'p95', 'p99.9', 'p100']
+
+
+def gen_deliveries(num, period_dur, rng):
+    start_times = rng.uniform(0, 20 * period_dur, num)
+    # Времена доставки от долей единицы до десятков тысяч
+    deliv_times = rng.lognormal(4, 2, num)
+    return start_times, start_times + deliv_times
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check merged periods and quantile accuracy')
+    parser.add_argument('--runs', type=int, default=4)
+    parser.add_argument('--num', type=int, default=20000,
+                        help='Number of deliveries per run')
+    parser.add_argument('--period-dur', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    runs = [gen_deliveries(args.num, args.period_dur, rng)
+            for _ in range(args.runs)]
+
+    periods_list = []
+    combined = create_periods(args.period_dur, AGGR_NAMES)
+    for start_times, cur_times in runs:
+        periods = create_periods(args.period_dur, AGGR_NAMES)
+        for start_time, cur_time in zip(start_times.tolist(),
+                                        cur_times.tolist()):
+            periods.register(start_time, cur_time)
+            combined.register(start_time, cur_time)
+        periods_list.append(periods)
+
+    merged = merge_periods(periods_list).get_periods()
+    expected = combined.get_periods()
+    hists = merged.pop('hist')
+    expected_hists = expected.pop('hist')
+    assert merged.drop(columns='sum').equals(expected.drop(columns='sum')), \
+        'merge_periods differs from registering all deliveries together'
+    assert np.allclose(merged['sum'], expected['sum'], rtol=1e-12), \
+        'merged sums differ'
+    assert all(np.array_equal(a, b) for a, b in zip(hists, expected_hists)), \
+        'merged histograms differ'
+    print(f'merge_periods of {args.runs} runs equals a single run')
+
+    # Квантиль по гистограмме -- элемент с номером floor(q * (n - 1)) в
+    # упорядоченной выборке интервала с точностью до корзины
+    start_times = np.concatenate([run[0] for run in runs])
+    deliv_times = np.concatenate([run[1] - run[0] for run in runs])
+    period_nums = (start_times // args.period_dur).astype(int)
+    rel_acc = combined.aggregators['p50'].rel_acc
+    worst = 0
+    for name in AGGR_NAMES:
+        if not name.startswith('p'):
+            continue
+
+        q = float(name[1:]) / 100
+        for num, estim in merged[name].items():
+            exact = np.quantile(deliv_times[period_nums == num], q,
+                                method='lower')
+            error = abs(estim - exact) / exact
+            assert error <= rel_acc + 1e-9, \
+                (f'{name} of period {num}: {estim} vs exact {exact}, '
+                 f'relative error {error:.4f} > {rel_acc}')
+            worst = max(worst, error)
+    print(f'quantiles within relative accuracy {rel_acc}: '
+          f'worst error {worst:.4f}')
+
+    for name in ['p100.1', 'p150']:
+        try:
+            create_periods(args.period_dur, [name])
+        except ValueError:
+            continue
+        raise AssertionError(f'{name} is accepted')
+    print('quantiles above p100 are rejected')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+from bisect import insort
+
+import numpy as np
+import networkx as nx
+
+
+# Матрица смежности, которая обновляется по строкам вместе с графом роутера.
+# Снаружи узлы упорядочены по возрастанию, как в nx.to_numpy_array с
+# nodelist=sorted(graph). Узлы только добавляются.
+class AdjacencyMatrix:
+    def __init__(self, capacity=16):
+        self.nodes = []
+
+        # Новые узлы добавляются в конец, а строки упорядочиваются при
+        # следующем чтении, поэтому добавление узла не сдвигает матрицу
+        self.__slots = {}
+        self.__weights = np.zeros((capacity, capacity))
+        self.__edges = np.zeros((capacity, capacity))
+
+        # Упорядоченные представления, пересчитываются после изменений
+        self.__views = None
+
+    @classmethod
+    def from_graph(cls, graph: nx.DiGraph, weight='weight'):
+        amatrix = cls(max(len(graph), 1))
+        for node in sorted(graph):
+            amatrix.add_node(node)
+
+        for u, v, w in graph.edges.data(weight, default=1):
+            amatrix.add_edge(u, v, w)
+
+        return amatrix
+
+    # Матрица может быть плоской (так она хранится в данных для обучения)
+    @classmethod
+    def from_array(cls, array: np.ndarray):
+        if array.ndim == 1:
+            array = array.reshape(int(len(array)**(1/2)), -1)
+
+        n = len(array)
+        amatrix = cls(max(n, 1))
+        for node in range(n):
+            amatrix.add_node(node)
+
+        amatrix.__weights[:n, :n] = array
+        amatrix.__edges[:n, :n] = array != 0
+        return amatrix
+
+    def copy(self):
+        amatrix = AdjacencyMatrix(1)
+        amatrix.nodes = list(self.nodes)
+        amatrix.__slots = dict(self.__slots)
+        amatrix.__weights = self.__weights.copy()
+        amatrix.__edges = self.__edges.copy()
+        return amatrix
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.__slots
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __grow(self, size):
+        capacity = len(self.__weights)
+        if size <= capacity:
+            return
+
+        while capacity < size:
+            capacity *= 2
+
+        n = len(self.nodes)
+        weights = np.zeros((capacity, capacity))
+        weights[:n, :n] = self.__weights[:n, :n]
+        edges = np.zeros((capacity, capacity))
+        edges[:n, :n] = self.__edges[:n, :n]
+        self.__weights, self.__edges = weights, edges
+
+    def add_node(self, node):
+        if node in self.__slots:
+            return
+
+        self.__grow(len(self.nodes) + 1)
+        self.__slots[node] = len(self.nodes)
+        insort(self.nodes, node)
+        self.__views = None
+
+    def add_edge(self, u, v, weight=1):
+        self.add_node(u)
+        self.add_node(v)
+
+        i, j = self.__slots[u], self.__slots[v]
+        self.__weights[i, j] = weight
+        self.__edges[i, j] = 1
+        self.__views = None
+
+    def remove_edge(self, u, v):
+        i, j = self.__slots[u], self.__slots[v]
+        self.__weights[i, j] = 0
+        self.__edges[i, j] = 0
+        self.__views = None
+
+    # Заменить исходящие ребра узла: {nbr: edge_data, ...}
+    def set_row(self, node, adj: dict, weight='weight'):
+        self.add_node(node)
+        for nbr in adj:
+            self.add_node(nbr)
+
+        i = self.__slots[node]
+        n = len(self.nodes)
+        self.__weights[i, :n] = 0
+        self.__edges[i, :n] = 0
+
+        for nbr, edge_data in adj.items():
+            j = self.__slots[nbr]
+            self.__weights[i, j] = edge_data.get(weight, 1)
+            self.__edges[i, j] = 1
+
+        self.__views = None
+
+    # Представления только для чтения
+
+    @property
+    def weights(self):
+        return self.__get_views()[0]
+
+    # Матрица из нулей и единиц (как nx.to_numpy_array с weight=None)
+    @property
+    def edges(self):
+        return self.__get_views()[1]
+
+    def __get_views(self):
+        if self.__views is None:
+            n = len(self.nodes)
+            order = [self.__slots[node] for node in self.nodes]
+
+            # Новые узлы добавлены не по порядку, переставим строки один раз
+            if order != list(range(n)):
+                for arr in (self.__weights, self.__edges):
+                    arr[:n, :n] = arr[np.ix_(order, order)]
+                self.__slots = {node: i for i, node in enumerate(self.nodes)}
+
+            views = self.__weights[:n, :n], self.__edges[:n, :n]
+            for view in views:
+                view.flags.writeable = False
+
+            self.__views = views
+
+        return self.__views
@@ -3,10 +3,13 @@ from typing import Callable
 import networkx as nx
 
 from ..messages import *
+from ..dispatch import *
 
 
-class MsgHandler:
-    # Базовый агент, который обрабатывает пришедшие сообщения
+class MsgHandler(Dispatcher):
+    # Базовый агент, который обрабатывает пришедшие сообщения. Сервисные
+    # сообщения обрабатываются методами подклассов с декоратором
+    # handles('inner', <тип сообщения>).
 
     def __init__(self,
                  id: int,
@@ -18,45 +21,77 @@ class MsgHandler:
         self.get_time = get_time
         self.router_graph = router_graph
 
+        self.nbrs_changed()
+
+    # Соседи хранятся кортежами и пересчитываются после изменения ребер
+    # роутера (nbrs_changed)
+
     @property
-    def out_nbrs(self):
-        return [nbr for _, nbr in self.router_graph.out_edges(self.id)]
+    def out_nbrs(self) -> tuple:
+        if self._out_nbrs is None:
+            self._out_nbrs = tuple(
+                    nbr for _, nbr in self.router_graph.out_edges(self.id))
+        return self._out_nbrs
 
     @property
-    def in_nbrs(self):
-        return [nbr for nbr, _ in self.router_graph.in_edges(self.id)]
+    def in_nbrs(self) -> tuple:
+        if self._in_nbrs is None:
+            self._in_nbrs = tuple(
+                    nbr for nbr, _ in self.router_graph.in_edges(self.id))
+        return self._in_nbrs
 
     @property
-    def all_nbrs(self):
+    def all_nbrs(self) -> tuple:
         return self.in_nbrs + self.out_nbrs
 
+    # Выходные соседи по возрастанию
+    @property
+    def sorted_out_nbrs(self) -> tuple:
+        if self._sorted_out_nbrs is None:
+            self._sorted_out_nbrs = tuple(sorted(self.out_nbrs))
+        return self._sorted_out_nbrs
+
+    def nbrs_changed(self):
+        self._out_nbrs = None
+        self._in_nbrs = None
+        self._sorted_out_nbrs = None
+
     def handle(self, msg: Message) -> list[Message]:
-        if isinstance(msg, InMsg):
-            sender = msg.from_node
-            msg = msg.inner_msg
-
-            if isinstance(msg, PkgMsg):
-                pkg = msg.pkg
-
-                if pkg.dst == self.id:
-                    # Пакет пришел нам
-
-                    return [PkgReceivedMsg(pkg)]
-                else:
-                    # Пакет не наш, передаем его дальше
-
-                    next_node, resp = self.route(sender, pkg)
-                    return [OutMsg(self.id, next_node, PkgMsg(pkg))] + resp
-            elif isinstance(msg, ServiceMsg):
-                return self.handle_service_msg(sender, msg)
-        elif isinstance(msg, InitMsg):
-            return self.init(msg.config)
-        elif isinstance(msg, AddLinkMsg):
-            return self.add_link(**msg.content)
-        elif isinstance(msg, RemoveLinkMsg):
-            return self.remove_link(**msg.content)
+        return self.dispatch_tables['msg'][msg.__class__](self, msg)
+
+    # Сообщения, пришедшие от соседа, обрабатываются по таблице 'inner':
+    # fun(self, inner_msg, sender)
+    @handles('msg', InMsg)
+    def handle_in(self, msg: InMsg) -> list[Message]:
+        inner_msg = msg.inner_msg
+        return self.dispatch_tables['inner'][inner_msg.__class__](
+                self, inner_msg, msg.from_node)
+
+    @handles('inner', PkgMsg)
+    def handle_pkg(self, msg: PkgMsg, sender: int) -> list[Message]:
+        pkg = msg.pkg
+
+        if pkg.dst == self.id:
+            # Пакет пришел нам
+
+            return [PkgReceivedMsg(pkg)]
         else:
-            raise UnsupportedMsgType(msg)
+            # Пакет не наш, передаем его дальше
+
+            next_node, resp = self.route(sender, pkg)
+            return [OutMsg(self.id, next_node, PkgMsg(pkg))] + resp
+
+    @handles('msg', InitMsg)
+    def handle_init(self, msg: InitMsg) -> list[Message]:
+        return self.init(msg.config)
+
+    @handles('msg', AddLinkMsg)
+    def handle_add_link(self, msg: AddLinkMsg) -> list[Message]:
+        return self.add_link(msg.node, msg.direction, msg.edge_data)
+
+    @handles('msg', RemoveLinkMsg)
+    def handle_remove_link(self, msg: RemoveLinkMsg) -> list[Message]:
+        return self.remove_link(msg.node, msg.direction)
 
     def init(self, config) -> list[Message]:
         return []
@@ -70,6 +105,7 @@ class MsgHandler:
 
         if direction != 'in':  # node <-(out) self
             self.router_graph.add_edge(self.id, node, **edge_data)
+            self.nbrs_changed()
 
         return []
 
@@ -79,16 +115,16 @@ class MsgHandler:
 
         if direction != 'in':
             self.router_graph.remove_edge(self.id, node)
+            self.nbrs_changed()
 
         return []
 
     def route(self, sender: int, pkg: Package) -> tuple[int, list[Message]]:
         raise NotImplementedError()
 
-    def handle_service_msg(self,
-                           sender: int,
-                           msg: ServiceMsg) -> list[Message]:
-        raise UnsupportedMsgType(msg)
+    # Освободить ресурсы после симуляции
+    def close(self):
+        pass
 
 
 class RewardAgent:
@@ -1,4 +1,5 @@
 import logging
+from functools import partial
 
 import torch as tch
 import numpy as np
@@ -6,6 +7,7 @@ import networkx as nx
 
 from .base import *
 from .linkstate import *
+from .training import *
 from ..constants import MAIN_LOGGER
 from ..messages import *
 from ..memory import *
@@ -30,37 +32,92 @@ class DQNRouter(LinkStateRouter, RewardAgent):
                  embeddings,
                  optimizer,
                  addit_inputs=[],
+                 replay={'name': 'uniform'},
+                 training={'mode': 'sync'},
+                 inference=None,
                  **kwargs):
         super().__init__(**kwargs)
 
         self.net_size = net_size
         self.batch_size = batch_size
-        self.memory = Memory(mem_capacity)
+        replay_params = {k: v for k, v in replay.items() if k != 'name'}
+        self.memory = memory_class(replay['name'])(mem_capacity,
+                                                   **replay_params)
         self.addit_inputs = addit_inputs
+        # Настройки пакетного расчета оценок в окружении, None -- оценки
+        # считаются сразу при маршрутизации
+        self.inference = inference
+        # Состояния соседей и входной тензор сети для каждого узла
+        # назначения, сбрасываются при изменении топологии
+        self.state_cache = {}
 
         self.brain = QNetwork(self.net_size,
                               layers,
                               activation,
                               embeddings,
                               addit_inputs)
-        self.brain.restore()
+        if training['mode'] == 'none':
+            # Роутеры без обучения используют общую модель
+            self.brain = model_registry.shared_module(self.brain)
+        else:
+            # Веса копируются на первом шаге обучения
+            self.brain.restore()
         logger.info('Restored model ' + self.brain.label)
         #print(self.brain.label)
 
         # Нужно обновлять энкодер, когда меняется топология
-        self.node_enc = node_encoder_class(
-                embeddings['name'])(embeddings['dim'])
+        enc_params = {k: v for k, v in embeddings.items() if k != 'name'}
+        self.node_enc = node_encoder_class(embeddings['name'])(**enc_params)
 
         self.optimizer = optim_class(
                 optimizer['name'])(self.brain.parameters(), lr=optimizer['lr'])
         self.loss_func = tch.nn.MSELoss()
 
+        # Когда обучаться на вознаграждениях
+        train_params = {k: v for k, v in training.items() if k != 'mode'}
+        self.training = training_class(training['mode'])(self._replay,
+                                                         self.brain,
+                                                         self.optimizer,
+                                                         self.get_time,
+                                                         **train_params)
+
+    def handle(self, msg: Message) -> list[Message]:
+        # Веса, обученные в другом потоке, применяются между сообщениями
+        self.training.apply(self.brain)
+        return super().handle(msg)
+
+    @handles('inner', PkgMsg)
+    def handle_pkg(self, msg: PkgMsg, sender: int) -> list[Message]:
+        pkg = msg.pkg
+        if self.inference is None or pkg.dst == self.id:
+            return super().handle_pkg(msg, sender)
+
+        # Маршрут выбирается, когда окружение посчитает оценки
+        nbrs, states, inputs = self.__get_nbr_states(pkg.dst)
+        callback = partial(self._finish_route, sender, pkg, nbrs, states)
+        return [InferenceMsg(self.brain, inputs, callback)]
+
     def route(self, sender: int, pkg: Package) -> tuple[int, list[Message]]:
-        states = self.__get_nbr_states(pkg.dst)
-        pred = self.__predict(states).flatten()
+        nbrs, states, inputs = self.__get_nbr_states(pkg.dst)
+        pred = self.__predict(inputs).flatten()
+        to_idx = soft_argmax(pred, MIN_TEMP)
+        return self.__send_to(sender, pkg, nbrs, states, pred, to_idx)
+
+    def _finish_route(self, sender, pkg, nbrs, states, pred):
+        pred = pred.flatten()
         to_idx = soft_argmax(pred, MIN_TEMP)
 
-        to = sorted(self.out_nbrs)[to_idx]
+        if nbrs[to_idx] in self.out_nbrs:
+            to, resp = self.__send_to(sender, pkg, nbrs, states, pred, to_idx)
+        else:
+            # Линк к выбранному соседу оборвался, пока считались оценки:
+            # маршрут выбирается заново по текущим соседям
+            to, resp = self.route(sender, pkg)
+
+        return [OutMsg(self.id, to, PkgMsg(pkg))] + resp
+
+    def __send_to(self, sender, pkg, nbrs, states, pred, to_idx):
+        to = nbrs[to_idx]
 
         estim = -np.max(pred)
         saved_state = [elem[to_idx] for elem in states if len(elem) != 0]
@@ -68,42 +125,65 @@ class DQNRouter(LinkStateRouter, RewardAgent):
 
         return to, [OutMsg(self.id, sender, reward)] if sender != -1 else []
 
-    def handle_service_msg(self,
-                           sender: int,
-                           msg: ServiceMsg) -> list[Message]:
-        if isinstance(msg, RewardMsg):
-            new_estim, prev_state = self.receive_reward(msg)
-            self.memory.add((prev_state, sender, -new_estim))
-            self.__replay()
-            return []
-        else:
-            return super().handle_service_msg(sender, msg)
+    @handles('inner', RewardMsg)
+    def handle_reward(self, msg: RewardMsg, sender: int) -> list[Message]:
+        new_estim, prev_state = self.receive_reward(msg)
+        with self.training.lock:
+            self.memory.add(prev_state, -new_estim)
+        self.training.reward()
+        return []
 
     def network_changed(self):
-        self.node_enc.fit(self.router_graph)
-
-    def __predict(self, states):
-        self.brain.eval()
-        #print(states)
-        output = self.brain(*states)
-        return output.clone().detach().numpy()
-
-    # Дообучить модель
-    def __train(self, states, targets):
+        self.node_enc.fit(self.adjacency)
+        self.state_cache.clear()
+
+    def __predict(self, inputs):
+        # Переключение режима обходит все подмодули, поэтому только при
+        # смене режима
+        if self.brain.training:
+            self.brain.eval()
+        with tch.no_grad():
+            return self.brain.forward_input(inputs).numpy()
+
+    def close(self):
+        self.training.close()
+
+    # Дообучить модель, вернуть ошибки на примерах
+    def __train(self, brain, optimizer, states, targets, weights=None):
         #print(states)
-        self.brain.train()
-        self.optimizer.zero_grad()
-
-        output = self.brain(*states)
-        loss = self.loss_func(output, targets)
+        brain.own_weights()
+        if not brain.training:
+            brain.train()
+        optimizer.zero_grad()
+
+        output = brain(*states)
+        if weights is None:
+            loss = self.loss_func(output, targets)
+        else:
+            weights = tch.tensor(weights[:, None], dtype=tch.float)
+            loss = (weights * (output - targets) ** 2).mean()
         loss.backward()
 
-        self.optimizer.step()
+        optimizer.step()
 
-        return float(loss)
+        return (output - targets).detach().numpy().flatten()
 
-    # Получить состояния для всех соседей
+    # Получить соседей, их состояния и входной тензор сети
     def __get_nbr_states(self, dst_node):
+        self.check_network()
+
+        try:
+            return self.state_cache[dst_node]
+        except KeyError:
+            pass
+
+        nbrs = self.sorted_out_nbrs
+        states = self.__build_nbr_states(dst_node, nbrs)
+        entry = nbrs, states, self.brain.prepare(*states)
+        self.state_cache[dst_node] = entry
+        return entry
+
+    def __build_nbr_states(self, dst_node, nbrs):
         cur_emb = self.node_enc.encode(self.id)
         dst_emb = self.node_enc.encode(dst_node)
 
@@ -112,15 +192,12 @@ class DQNRouter(LinkStateRouter, RewardAgent):
             others.append([])
 
             if inp['name'] == 'amatrix':
-                inp['data'] = nx.to_numpy_array(
-                        self.router_graph,
-                        weight=None,  # не указывать веса
-                        nodelist=sorted(self.router_graph)).flatten()
+                inp['data'] = self.adjacency.edges.flatten()
             else:
                 raise Exception('Unknown additional input: ' + inp['name'])
 
         cur_embs, dst_embs, nbr_embs = [], [], []
-        for nbr in sorted(self.out_nbrs):
+        for nbr in nbrs:
             cur_embs.append(cur_emb)
             dst_embs.append(dst_emb)
 
@@ -136,14 +213,17 @@ class DQNRouter(LinkStateRouter, RewardAgent):
         return states
 
     # Обучиться на вознаграждениях
-    def __replay(self):
+    def _replay(self, brain, optimizer):
         # Получить batch_size случайных элементов из памяти
-        states = []
-        estims = []
-        for i, (state, sender, new_estim) in \
-                self.memory.sample(self.batch_size):
-            states.append(state)
-            estims.append([new_estim])
-
-        self.__train(stack_rows(states),
-                     tch.tensor(estims, dtype=torch.float))
+        with self.training.lock:
+            slots, states, estims, weights = \
+                self.memory.sample(self.batch_size)
+
+        errors = self.__train(brain,
+                              optimizer,
+                              states,
+                              tch.tensor(estims[:, None], dtype=tch.float),
+                              weights)
+
+        with self.training.lock:
+            self.memory.update(slots, errors)
@@ -4,14 +4,46 @@ import networkx as nx
 
 from .base import *
 from ..messages import *
+from ..adjacency import *
+
+
+# Таймер удержания анонсов, у роутера он один
+HOLD_DOWN_TIMER = 0
+
+# Сколько анонсов изменений одного узла ждут пропущенные. Пропуск возможен,
+# только пока роутер отрезан от узла, после восстановления линка состояние
+# узла приходит целиком (__sync_states), поэтому лишние анонсы не нужны.
+MAX_PENDING_ANNOUNS = 64
 
 
 class LinkStateRouter(MsgHandler):
-    def __init__(self, **kwargs):
+    def __init__(self, hold_down=0, **kwargs):
         super().__init__(**kwargs)
 
         self.seq_num = 0
+        # Номер последнего примененного анонса каждого узла. Анонсы
+        # изменений, которые обогнали предыдущие, ждут их в pending_announs.
         self.announs = {}
+        self.pending_announs = {}
+
+        # Изменения своих ребер копятся hold_down единиц времени и
+        # рассылаются одним анонсом, 0 -- анонс сразу после изменения
+        self.hold_down = hold_down
+        self.hold_down_active = False
+        # Ребра из последнего анонса, от них считаются изменения
+        self.announced = {}
+        self.full_announ = True
+
+        # Матрица смежности графа роутера, обновляется вместе с ним
+        self.adjacency = AdjacencyMatrix.from_graph(self.router_graph)
+
+        # Дерево кратчайших путей от роутера: (расстояния, предки, следующие
+        # узлы). Строится при маршрутизации, None -- нужно перестроить.
+        self.routes = None
+
+        # Топология изменилась после последнего вызова network_changed.
+        # Он выполняется перед маршрутизацией один раз на все изменения.
+        self.network_dirty = False
 
     @property
     def all_nodes(self):
@@ -20,45 +52,69 @@ class LinkStateRouter(MsgHandler):
     def init(self,
              config: dict) -> list[Message]:
         msgs = super().init(config)
-        return msgs + self.__announce_state()
 
-    def handle_service_msg(self,
-                           sender: int,
-                           msg: ServiceMsg) -> list[Message]:
-        if isinstance(msg, StateAnnounMsg):
-            if self.__proc_announ(msg):
-                # Если анонса еще не было
+        if 'topology' in config:
+            self.__bootstrap(config['topology'])
+            return msgs
 
-                # Кажется, что тут в кольце отправитель нового состояния
-                # получает его и обрабатывает
+        # Начальное состояние рассылается без таймера
+        return msgs + self.__state_changed(0)
 
-                # Разослать пришедшее состояние соседям
-                nbrs = self.out_nbrs
-                nbrs.remove(sender)
-                return [OutMsg(self.id, nbr, msg) for nbr in nbrs]
+    @handles('inner', StateAnnounMsg)
+    def handle_announ(self,
+                      msg: StateAnnounMsg,
+                      sender: int) -> list[Message]:
+        # Свой анонс, вернувшийся через кольцо, не нужен
+        if msg.node != self.id and self.__proc_announ(msg):
+            # Если анонса еще не было
 
-            return []
-        else:
-            return super().handle_service_msg(sender, msg)
+            # Разослать пришедшее состояние соседям, кроме отправителя
+            return [OutMsg(self.id, nbr, msg)
+                    for nbr in self.out_nbrs if nbr != sender]
+
+        return []
+
+    @handles('msg', HoldDownMsg)
+    def handle_hold_down(self, msg: HoldDownMsg) -> list[Message]:
+        self.hold_down_active = False
+        return self.__announce_state()
 
     def add_link(self,
                  node: int,
                  direction: str,
                  edge_data: dict) -> list[Message]:
+        old_edges = self.__out_edges(self.id)
         resp = super().add_link(node, direction, edge_data)
-        # Разослать новое состояние соседям
-        return resp + self.__announce_state()
+        self.__check_routes(self.id, old_edges)
+
+        # Линк мог соединить части сети, которые не получали анонсы друг
+        # друга, поэтому состояние рассылается целиком
+        self.full_announ = True
+        resp = resp + self.__state_changed(self.hold_down)
+
+        if direction != 'in':
+            resp += self.__sync_states(node)
+        return resp
 
     def remove_link(self,
                     node: int,
                     direction: str) -> list[Message]:
+        old_edges = self.__out_edges(self.id)
         resp = super().remove_link(node, direction)
-        return resp + self.__announce_state()
+        self.__check_routes(self.id, old_edges)
+        return resp + self.__state_changed(self.hold_down)
 
     def route(self, sender: int, pkg: Package) -> tuple[int, list[Message]]:
-        # Найти кратчайший путь и взять оттуда соседа
-        path = nx.dijkstra_path(self.router_graph, self.id, pkg.dst)
-        return path[1], []
+        self.check_network()
+
+        # Взять соседа из кратчайшего пути, как в nx.dijkstra_path
+        if self.routes is None:
+            self.routes = self.__build_routes()
+
+        try:
+            return self.routes[2][pkg.dst], []
+        except KeyError:
+            raise nx.NetworkXNoPath(f'No path to {pkg.dst}.')
 
 
     #def networkComplete(self):
@@ -67,44 +123,172 @@ class LinkStateRouter(MsgHandler):
     #def networkInit(self):
     #    raise NotImplementedError()
 
+    # Взять граф сети целиком. Состояние роутера такое же, как после
+    # рассылки начальных анонсов: ребра каждого узла в его порядке, от
+    # каждого узла получен анонс 1.
+    def __bootstrap(self, topology: nx.DiGraph):
+        self.router_graph.clear()
+        self.router_graph.add_edges_from(topology.edges(data=True))
+        self.nbrs_changed()
+        self.routes = None
+
+        self.announs = {node: 1 for node in topology if node != self.id}
+        self.seq_num = 1
+        self.announced = self.__edges_copy(self.id)
+        self.full_announ = False
+
+        # Матрица смежности строится один раз на все роутеры
+        if 'amatrix' not in topology.graph:
+            topology.graph['amatrix'] = AdjacencyMatrix.from_graph(topology)
+        self.adjacency = topology.graph['amatrix'].copy()
+        self.network_dirty = True
+
+    # Свои ребра изменились: разослать анонс сразу или запустить таймер
+    def __state_changed(self, hold_down) -> list[Message]:
+        self.adjacency.set_row(self.id, self.router_graph.adj[self.id])
+        self.network_dirty = True
+
+        if hold_down == 0:
+            return self.__announce_state()
+
+        if self.hold_down_active:
+            return []  # изменение уйдет с запланированным анонсом
+
+        self.hold_down_active = True
+        return [DelayedMsg(HOLD_DOWN_TIMER,
+                           hold_down,
+                           LoopbackMsg(HoldDownMsg()))]
+
     def __announce_state(self) -> list[Message]:
+        # Снимок ребер, граф роутера продолжит меняться
+        state = self.__edges_copy(self.id)
+
+        if self.full_announ:
+            changes = state
+        else:
+            changes = {nbr: edge_data for nbr, edge_data in state.items()
+                       if self.announced.get(nbr) != edge_data}
+            for nbr in self.announced:
+                if nbr not in state:
+                    changes[nbr] = None
+
+            if not changes:
+                return []  # ребра вернулись к анонсированным
+
         self.seq_num += 1
-        state = self.router_graph.adj[self.id]
-        announ = StateAnnounMsg(self.id, self.seq_num, state)
-        resp = [OutMsg(from_node=self.id, to_node=v, inner_msg=announ)
+        announ = StateAnnounMsg(self.id, self.seq_num, changes,
+                                self.full_announ)
+        self.announced = state
+        self.full_announ = False
+
+        return [OutMsg(from_node=self.id, to_node=v, inner_msg=announ)
                 for v in self.out_nbrs]
 
-        self.network_changed()
-
-        return resp
+    # Отправить новому соседу известные состояния узлов целиком. Пока линка
+    # не было, части сети могли пропустить анонсы изменений друг друга;
+    # более новые состояния сосед применит и разошлет дальше.
+    def __sync_states(self, nbr) -> list[Message]:
+        return [OutMsg(self.id, nbr, StateAnnounMsg(node,
+                                                    seq,
+                                                    self.__edges_copy(node)))
+                for node, seq in self.announs.items() if node != nbr]
 
+    # Применить анонс, если он новый. Анонсы изменений применяются по
+    # порядку номеров, полный анонс применяется сразу.
     def __proc_announ(self, msg: StateAnnounMsg) -> bool:
-        if msg.node not in self.announs or \
-                self.announs[msg.node].seq < msg.seq:
-            self.announs[msg.node] = msg
-            self.__proc_new_announ(msg.node, msg.state)
-
-            #if self.networkComplete():
-            #    self.networkInit()
-            #self.network_changed()
+        node = msg.node
+        pending = self.pending_announs.get(node)
+        if msg.seq <= self.announs.get(node, 0) or \
+                not msg.full and pending is not None and msg.seq in pending:
+            return False
 
+        if not msg.full and msg.seq != self.announs.get(node, 0) + 1:
+            pending = self.pending_announs.setdefault(node, {})
+            pending[msg.seq] = msg
+            if len(pending) > MAX_PENDING_ANNOUNS:
+                del pending[min(pending)]
             return True
 
-        return False
+        self.__proc_new_announ(msg)
+
+        if pending is not None:
+            for seq in [seq for seq in pending if seq <= msg.seq]:
+                del pending[seq]
+            while msg.seq + 1 in pending:
+                msg = pending.pop(msg.seq + 1)
+                self.__proc_new_announ(msg)
+            if not pending:
+                del self.pending_announs[node]
+
+        return True
+
+    # Вызвать network_changed, если топология изменилась
+    def check_network(self):
+        if self.network_dirty:
+            self.network_dirty = False
+            self.network_changed()
 
     def network_changed(self):
         #print('EMPTY')
         pass
 
-    def __proc_new_announ(self, node: int, state) -> bool:
+    def __proc_new_announ(self, msg: StateAnnounMsg):
         #print('new_super')
-        # Удалить всех соседей узла
+        node = msg.node
+        old_edges = self.__out_edges(node)
+
+        if msg.full:
+            # Удалить всех соседей узла
+            edges = list(self.router_graph.edges(node))
+            self.router_graph.remove_edges_from(edges)
+
+        # Добавить соседей из состояния, удалить оборванные ребра
+        for nbr, edge_data in msg.state.items():
+            if edge_data is not None:
+                self.router_graph.add_edge(node, nbr, **edge_data)
+            elif self.router_graph.has_edge(node, nbr):
+                self.router_graph.remove_edge(node, nbr)
+        self.nbrs_changed()
+
+        self.announs[node] = msg.seq
+        self.__check_routes(node, old_edges)
+        self.adjacency.set_row(node, self.router_graph.adj[node])
+        self.network_dirty = True
+
+    def __edges_copy(self, node) -> dict:
+        return {nbr: dict(edge_data)
+                for nbr, edge_data in self.router_graph.adj[node].items()}
+
+    def __out_edges(self, node) -> list:
+        return [(nbr, edge_data.get('weight', 1))
+                for nbr, edge_data in self.router_graph.adj[node].items()]
+
+    def __build_routes(self):
+        dists, paths = nx.single_source_dijkstra(self.router_graph, self.id)
+        preds = {v: path[-2] for v, path in paths.items() if len(path) > 1}
+        next_nodes = {v: path[1] for v, path in paths.items() if len(path) > 1}
+        return dists, preds, next_nodes
+
+    # Проверить, что пути не изменились после замены исходящих ребер узла.
+    # Дерево остается прежним, если ребра дерева из узла идут в том же
+    # порядке с теми же весами, а остальные ребра строго хуже путей дерева.
+    # Иначе из путей одной длины мог бы выбираться другой.
+    def __check_routes(self, node, old_edges: list):
+        if self.routes is None:
+            return
 
-        # Добавить соседей из состояния
-        edges = list(self.router_graph.edges(node))
-        self.router_graph.remove_edges_from(edges)
+        dists, preds, _ = self.routes
+        if node not in dists:
+            return  # ребра недостижимого узла не влияют на пути
 
-        for nbr, edge_data in state.items():
-            self.router_graph.add_edge(node, nbr, **edge_data)
+        old_tree = [(v, w) for v, w in old_edges if preds.get(v) == node]
+        new_tree = []
+        for v, w in self.__out_edges(node):
+            if preds.get(v) == node:
+                new_tree.append((v, w))
+            elif v not in dists or dists[node] + w <= dists[v]:
+                self.routes = None
+                return
 
-        self.network_changed()
+        if new_tree != old_tree:
+            self.routes = None
@@ -1,3 +1,5 @@
+import networkx as nx
+
 from .base import *
 from ..messages import *
 
@@ -30,7 +32,7 @@ class QRouter(MsgHandler, RewardAgent):
         resps = super().add_link(node, direction, edge_data)
 
         # Добавить соседа в Q-таблицу
-        if direction == 'out':
+        if direction != 'in':
             self.check_nbr(node)
 
         # Если выходной сосед был удален, то оставить его в таблице, но не
@@ -39,11 +41,21 @@ class QRouter(MsgHandler, RewardAgent):
         return resps
 
     def route(self, sender: int, pkg: Package) -> tuple[int, list[Message]]:
-        self.check_dst(pkg.dst)
-
-        Qs = self.actual_Q(pkg.dst)
-        # Получить соседа с минимальной оценкой
-        next_node, estim = min(Qs.items(), key=lambda x: x[1])
+        Qd = self.check_dst(pkg.dst)
+        out_nbrs = self.out_nbrs
+        if not out_nbrs:
+            # Все выходные линки роутера оборваны
+            raise nx.NetworkXNoPath(f'No path to {pkg.dst}: '
+                                    f'router {self.id} has no neighbours.')
+
+        # Получить соседа с минимальной оценкой. При равных оценках
+        # выбирается первый сосед в out_nbrs, как в min.
+        nbrs = iter(out_nbrs)
+        next_node = next(nbrs)
+        estim = Qd[next_node]
+        for y in nbrs:
+            if Qd[y] < estim:
+                next_node, estim = y, Qd[y]
 
         reward_msg = self.register_recent_pkg(pkg, estim, pkg.dst)
 
@@ -55,35 +67,37 @@ class QRouter(MsgHandler, RewardAgent):
 
         return next_node, resp
 
-    def handle_service_msg(self, y: int, msg: ServiceMsg) -> list[Message]:
-        if isinstance(msg, RewardMsg):
-            # Получили обратную связь
+    @handles('inner', RewardMsg)
+    def handle_reward(self, msg: RewardMsg, y: int) -> list[Message]:
+        # Получили обратную связь
 
-            estim_new, d = self.receive_reward(msg)
-            estim_delta = estim_new - self.Q[d][y]
-            self.Q[d][y] += estim_delta * self.lr
+        estim_new, d = self.receive_reward(msg)
+        estim_delta = estim_new - self.Q[d][y]
+        self.Q[d][y] += estim_delta * self.lr
 
-            return []
-        else:
-            return super().handle_service_msg(y, msg)
+        return []
 
-    def check_dst(self, d):
-        if d not in self.Q:
-            self.Q[d] = {y: 0 if d == y else self.init_estim
-                         for y in self.out_nbrs}
+    # Вернуть оценки для узла назначения
+    def check_dst(self, d) -> dict:
+        try:
+            return self.Q[d]
+        except KeyError:
+            pass
 
-    # Только выходные соседи
+        Qd = self.Q[d] = {y: 0 if d == y else self.init_estim
+                          for y in self.out_nbrs}
+        return Qd
+
+    # Только выходные соседи. Узлы назначения, которые появились, пока линк
+    # к соседу был оборван, получают начальную оценку.
     def check_nbr(self, nbr):
         for d, ys in self.Q.items():
             if nbr not in ys:
-                ys[to] = 0 if d == nbr else self.init_estim
+                ys[nbr] = 0 if d == nbr else self.init_estim
 
     def actual_Q(self, d: int) -> dict[int, float]:
         # Получить из Q-таблицы оценки только для нужного узла через актуальных
         # соседей
 
-        Qa = {}
-        for n in self.out_nbrs:
-            Qa[n] = self.Q[d][n]
-
-        return Qa
+        Qd = self.Q[d]
+        return {n: Qd[n] for n in self.out_nbrs}
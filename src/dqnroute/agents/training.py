@@ -0,0 +1,203 @@
+import queue
+import threading
+from copy import deepcopy
+from contextlib import nullcontext
+from typing import Callable
+
+
+# Планировщики обучения DQN. Роутер сообщает о каждом вознаграждении,
+# планировщик решает, когда выполнить шаг обучения train_step(model,
+# optimizer). Память переходов используется под lock.
+
+
+# Шаг обучения на каждое вознаграждение
+class SyncTraining:
+    def __init__(self,
+                 train_step: Callable,
+                 model,
+                 optimizer,
+                 get_time: Callable[[], int]):
+        self.train_step = train_step
+        self.model = model
+        self.optimizer = optimizer
+        self.get_time = get_time
+
+        self.lock = nullcontext()
+
+    def reward(self):
+        self.train_step(self.model, self.optimizer)
+
+    # Применить новые веса к модели роутера
+    def apply(self, model):
+        pass
+
+    def close(self):
+        pass
+
+
+# Без обучения, роутер использует предобученную модель как есть
+class NoTraining(SyncTraining):
+    def reward(self):
+        pass
+
+
+# steps шагов обучения после every вознаграждений или на первом
+# вознаграждении через period единиц времени после прошлого обучения
+class DeferredTraining(SyncTraining):
+    def __init__(self, *args, every=None, period=None, steps=1):
+        super().__init__(*args)
+
+        if every is None and period is None:
+            every = 1
+
+        self.every = every
+        self.period = period
+        self.steps = steps
+
+        self.rewards = 0
+        self.last_time = self.get_time()
+
+    def reward(self):
+        self.rewards += 1
+        if (self.every is None or self.rewards < self.every) and \
+                (self.period is None or
+                 self.get_time() - self.last_time < self.period):
+            return
+
+        for _ in range(self.steps):
+            self.train_step(self.model, self.optimizer)
+
+        self.rewards = 0
+        self.last_time = self.get_time()
+
+
+# Поток, который обучает модели всех роутеров процесса по очереди. Ошибка
+# шага обучения не останавливает поток, она сохраняется в обучении роутера.
+class TrainWorker:
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def submit(self, training):
+        self.queue.put(training)
+
+    def __run(self):
+        while True:
+            self.queue.get().run_steps()
+
+
+# Обучение копии модели в фоновом потоке. Роутер применяет опубликованные
+# веса в безопасных точках (перед обработкой сообщения), результаты
+# симуляции зависят от планирования потоков. Если поток не успевает,
+# накопленные вознаграждения дают один раз steps шагов обучения.
+class BackgroundTraining(SyncTraining):
+    worker = None
+
+    def __init__(self,
+                 train_step: Callable,
+                 model,
+                 optimizer,
+                 get_time: Callable[[], int],
+                 every=1,
+                 steps=1,
+                 sync_every=1):
+        # Поток обучает свою копию модели со своим оптимизатором
+        model = deepcopy(model)
+        optimizer = optimizer.__class__(model.parameters(),
+                                        **optimizer.defaults)
+        super().__init__(train_step, model, optimizer, get_time)
+
+        self.every = every
+        self.steps = steps
+        self.sync_every = sync_every
+
+        self.lock = threading.Lock()
+        self.cond = threading.Condition()
+        self.rewards = 0
+        self.queued = False
+        self.trained = 0
+        self.published = None
+        self.stopped = False
+        self.error = None
+
+        self.__start_worker()
+
+    @classmethod
+    def __start_worker(cls):
+        if cls.worker is None or not cls.worker.thread.is_alive():
+            cls.worker = TrainWorker()
+
+    def reward(self):
+        with self.cond:
+            self.rewards += 1
+            if self.rewards < self.every or self.queued or self.stopped:
+                return
+
+            self.queued = True
+
+        self.__start_worker()
+        self.worker.submit(self)
+
+    def apply(self, model):
+        self.__check_error()
+        if self.published is None:
+            return
+
+        with self.cond:
+            state, self.published = self.published, None
+
+        model.own_weights()
+        model.load_state_dict(state)
+
+    # Дождаться текущего обучения и больше не обучаться
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.wait_for(lambda: not self.queued)
+
+        self.__check_error()
+
+    # Ошибка обучения в потоке выбрасывается в потоке симуляции
+    def __check_error(self):
+        if self.error is not None:
+            raise RuntimeError('Background training failed') from self.error
+
+    def run_steps(self):
+        with self.cond:
+            self.rewards = 0
+            stopped = self.stopped or self.error is not None
+
+        try:
+            if not stopped:
+                self.__train()
+        except Exception as e:
+            with self.cond:
+                self.error = e
+        finally:
+            with self.cond:
+                self.queued = False
+                self.cond.notify_all()
+
+    def __train(self):
+        for _ in range(self.steps):
+            self.train_step(self.model, self.optimizer)
+
+        self.trained += 1
+        if self.trained % self.sync_every == 0:
+            state = {k: v.clone() for k, v in
+                     self.model.state_dict().items()}
+            with self.cond:
+                self.published = state
+
+
+__training_clses = {
+    'sync': SyncTraining,
+    'none': NoTraining,
+    'deferred': DeferredTraining,
+    'background': BackgroundTraining
+}
+
+
+def training_class(mode):
+    return __training_clses[mode]
@@ -1,43 +1,248 @@
+import re
+import math
+from copy import deepcopy
+
+import numpy as np
 import pandas as pd
 
 
 class DelivPeriods:
-    def __init__(self, period_dur, aggregators):
-        columns = ['time'] + list(aggregators.keys())
-        self.periods = pd.DataFrame(columns=columns)
-
+    def __init__(self, period_dur, aggregators, capacity=64):
         # Длительность одного интервала
         self.period_dur = period_dur
         # Функции для формирования нового значения на основе предыдущего
-        self.aggregators = aggregators
+        self.aggregators = {
+            name: aggr if isinstance(aggr, Aggregator) else FuncAggr(aggr)
+            for name, aggr in aggregators.items()
+        }
 
-    def __register(self, period_num, deliv_time):
-        aggr_cols = self.periods.columns[1:]
+        # Агрегаторы с одинаковым ключом используют общее хранилище,
+        # например, все квантили считаются по одной гистограмме
+        self.storages = {}
+        # Ключ хранилища для каждого столбца
+        self.columns = {}
+        for name, aggr in self.aggregators.items():
+            key = name if aggr.key is None else aggr.key
+            self.columns[name] = key
+            self.storages.setdefault(key, aggr)
+
+        # Значения хранятся по столбцам, строка массива -- номер интервала.
+        # Количество доставок нужно, чтобы отличать пустые интервалы.
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.values = {key: aggr.create(0)
+                       for key, aggr in self.storages.items()}
+
+        self.__grow(capacity)
 
-        try:
-            aggr_data = self.periods.loc[period_num, aggr_cols]
-        except KeyError:  # новый интервал
-            aggr_data = [None] * len(aggr_cols)
+    def __grow(self, capacity):
+        size = len(self.counts)
 
-        aggr_data_new = [
-            self.aggregators[col](value, deliv_time)
-            for col, value in zip(aggr_cols, aggr_data)
-        ]
+        counts = np.zeros(capacity, dtype=np.int64)
+        counts[:size] = self.counts
+        self.counts = counts
 
-        time = period_num * self.period_dur
-        self.periods.loc[period_num] = [time] + aggr_data_new
+        for key, aggr in self.storages.items():
+            values = aggr.create(capacity)
+            values[:size] = self.values[key]
+            self.values[key] = values
+
+    def __register(self, period_num, deliv_time):
+        if period_num >= len(self.counts):  # новый интервал за пределами
+            self.__grow(max(period_num + 1, 2 * len(self.counts)))
+
+        self.counts[period_num] += 1
+        for key, aggr in self.storages.items():
+            aggr.update(self.values[key], period_num, deliv_time)
 
     def register(self, start_time: int, cur_time: int):
         deliv_time = cur_time - start_time
-        period_num = start_time // self.period_dur
+        period_num = int(start_time // self.period_dur)
 
         self.__register(period_num, deliv_time)
 
     def get_periods(self):
-        return self.periods.sort_index()
+        # Таблица собирается только по запросу
+        nums = np.flatnonzero(self.counts)
+
+        data = {'time': nums * self.period_dur}
+        for name, aggr in self.aggregators.items():
+            data[name] = aggr.finalize(self.values[self.columns[name]][nums])
+
+        return pd.DataFrame(data, index=nums)
+
+    # Объединить результаты другого запуска с теми же агрегаторами
+    def merge(self, other):
+        if self.period_dur != other.period_dur or \
+                self.storages.keys() != other.storages.keys():
+            raise Exception('Periods are not compatible')
+
+        size = len(other.counts)
+        if size > len(self.counts):
+            self.__grow(size)
+
+        self.counts[:size] += other.counts
+        for key, aggr in self.storages.items():
+            aggr.merge(self.values[key][:size], other.values[key])
+
+        return self
+
+
+class Aggregator:
+    # Агрегатор обновляет значение интервала в массиве всех интервалов
+
+    dtype = np.float64
+    # Значение пустого интервала
+    init = 0
+
+    # Ключ общего хранилища значений, None -- отдельное хранилище
+    key = None
+
+    def create(self, size):
+        return np.full(size, self.init, dtype=self.dtype)
+
+    def update(self, values, period_num, delta):
+        raise NotImplementedError()
+
+    def finalize(self, values):
+        return values
+
+    # Объединить значения других запусков на месте
+    def merge(self, values, other_values):
+        raise Exception(f'{self.__class__.__name__} is not mergeable')
+
+    # Прежний интерфейс агрегатора: fun(value, delta) возвращает новое
+    # значение интервала, value=None -- интервал пустой
+    def __call__(self, value, delta):
+        values = self.create(1)
+        if value is not None:
+            values[0] = value
+
+        self.update(values, 0, delta)
+        return values[0]
+
+
+class SumAggr(Aggregator):
+    def update(self, values, period_num, delta):
+        values[period_num] += delta
+
+    def merge(self, values, other_values):
+        values += other_values
+
+
+class CountAggr(Aggregator):
+    dtype = np.int64
+
+    def update(self, values, period_num, _):
+        values[period_num] += 1
+
+    def merge(self, values, other_values):
+        values += other_values
+
+
+class MinAggr(Aggregator):
+    init = np.inf
+
+    def update(self, values, period_num, delta):
+        if delta < values[period_num]:
+            values[period_num] = delta
 
+    def merge(self, values, other_values):
+        np.minimum(values, other_values, out=values)
 
-# Обработка начального значения
+
+class MaxAggr(Aggregator):
+    init = -np.inf
+
+    def update(self, values, period_num, delta):
+        if delta > values[period_num]:
+            values[period_num] = delta
+
+    def merge(self, values, other_values):
+        np.maximum(values, other_values, out=values)
+
+
+# Агрегатор на основе произвольной функции, значения хранятся как объекты
+class FuncAggr(Aggregator):
+    dtype = object
+    init = None
+
+    def __init__(self, fun):
+        self.fun = fun
+
+    def update(self, values, period_num, delta):
+        values[period_num] = self.fun(values[period_num], delta)
+
+
+# Гистограмма с логарифмическими корзинами. Границы корзин растут в gamma
+# раз, поэтому любой квантиль восстанавливается с относительной ошибкой
+# rel_acc. Память на интервал постоянная, гистограммы разных запусков
+# складываются.
+class LogHistAggr(Aggregator):
+    dtype = np.int64
+
+    def __init__(self, rel_acc=0.01, min_value=1e-2, max_value=1e7):
+        self.rel_acc = rel_acc
+        self.min_value = min_value
+        self.max_value = max_value
+
+        self.gamma = (1 + rel_acc) / (1 - rel_acc)
+        self.log_gamma = math.log(self.gamma)
+        # Нулевая корзина для значений не больше min_value
+        self.num_buckets = self.bucket(max_value) + 1
+
+    @property
+    def key(self):
+        return ('log_hist', self.rel_acc, self.min_value, self.max_value)
+
+    def bucket(self, value):
+        if value <= self.min_value:
+            return 0
+
+        return math.ceil(math.log(value / self.min_value) / self.log_gamma)
+
+    # Верхние границы корзин
+    def bounds(self):
+        return self.min_value * self.gamma ** np.arange(self.num_buckets)
+
+    # Значения, которыми представляются корзины
+    def bucket_values(self):
+        values = self.bounds() * 2 / (1 + self.gamma)
+        values[0] = 0
+        return values
+
+    def create(self, size):
+        return np.zeros((size, self.num_buckets), dtype=self.dtype)
+
+    def update(self, values, period_num, delta):
+        values[period_num, min(self.bucket(delta), self.num_buckets - 1)] += 1
+
+    def merge(self, values, other_values):
+        values += other_values
+
+
+class HistAggr(LogHistAggr):
+    def finalize(self, values):
+        # Гистограмма каждого интервала, границы -- bounds()
+        return list(values)
+
+
+class QuantileAggr(LogHistAggr):
+    def __init__(self, q, **kwargs):
+        super().__init__(**kwargs)
+
+        if not 0 <= q <= 1:
+            raise ValueError(f'Quantile must be in [0, 1], got {q}')
+        self.q = q
+
+    def finalize(self, values):
+        cum = np.cumsum(values, axis=1)
+        rank = self.q * (cum[:, -1] - 1)
+        buckets = np.argmax(cum > rank[:, np.newaxis], axis=1)
+        return self.bucket_values()[buckets]
+
+
+# Обработка начального значения для агрегатора из произвольной функции
+# (DelivPeriods принимает такие функции наравне с Aggregator)
 def wrap_aggr(fun, init=None):
     def wrapper(value, delta):
         if value is None:
@@ -48,16 +253,25 @@ def wrap_aggr(fun, init=None):
     return wrapper
 
 
+__aggr_clses = {
+    'sum': SumAggr,
+    'count': CountAggr,
+    'max': MaxAggr,
+    'min': MinAggr
+}
+
+
 def get_aggregator(name):
-    if name == 'sum':
-        return wrap_aggr(lambda value, delta: value + delta)
-    elif name == 'count':
-        return wrap_aggr(lambda value, _: value + 1, 1)
-    elif name == 'max':
-        return wrap_aggr(max)
-    elif name == 'min':
-        return wrap_aggr(min)
-    else:
+    # Квантиль задается в процентах: p50, p95, p99.9
+    match = re.fullmatch(r'p(\d+(\.\d+)?)', name)
+    if match is not None:
+        return QuantileAggr(float(match.group(1)) / 100)
+    elif name == 'hist':
+        return HistAggr()
+
+    try:
+        return __aggr_clses[name]()
+    except KeyError:
         raise Exception('Unknown aggregator function ' + name)
 
 
@@ -65,3 +279,12 @@ def create_periods(period_dur, aggr_names):
     aggregators = {name: get_aggregator(name) for name in aggr_names}
 
     return DelivPeriods(period_dur, aggregators)
+
+
+# Объединить результаты нескольких запусков (разные сиды, процессы)
+def merge_periods(periods_list):
+    merged = deepcopy(periods_list[0])
+    for periods in periods_list[1:]:
+        merged.merge(periods)
+
+    return merged
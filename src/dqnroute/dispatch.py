@@ -0,0 +1,53 @@
+from .messages import UnsupportedMsgType
+
+# Обработка сообщений по таблицам типов. Метод помечается декоратором
+# handles(table, *types), при создании класса обработчики его и базовых
+# классов собираются в таблицы {тип сообщения: функция}. Переопределенный
+# в подклассе метод попадает в таблицу подкласса. Обработчик вызывается
+# так:
+#   self.dispatch_tables[table][msg.__class__](self, msg, ...)
+# Для типа без своего обработчика один раз ищется обработчик базового типа,
+# поэтому количество типов не влияет на обработку.
+
+
+def handles(table: str, *types):
+    def decorator(fun):
+        fun.dispatch_types = getattr(fun, 'dispatch_types', []) + \
+            [(table, types)]
+        return fun
+
+    return decorator
+
+
+def unsupported_msg(self, msg, *args):
+    raise UnsupportedMsgType(msg)
+
+
+class DispatchTable(dict):
+    def __missing__(self, msg_type):
+        for base in msg_type.__mro__[1:]:
+            if base in self:
+                self[msg_type] = self[base]
+                return self[base]
+
+        return unsupported_msg
+
+
+class Dispatcher:
+    dispatch_tables = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        names = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                for table, types in getattr(attr, 'dispatch_types', []):
+                    for msg_type in types:
+                        names.setdefault(table, {})[msg_type] = name
+
+        cls.dispatch_tables = {
+            table: DispatchTable({msg_type: getattr(cls, name)
+                                  for msg_type, name in handlers.items()})
+            for table, handlers in names.items()
+        }
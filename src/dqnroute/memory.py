@@ -1,20 +1,156 @@
 import random
 
+import numpy as np
 
+
+# Кольцевой буфер переходов (состояние, оценка). Каждая часть состояния
+# хранится в отдельном массиве (capacity, dim), массивы создаются при первом
+# добавлении с типом данных части состояния.
+#
+# Переход занимает itemsize * (сумма размерностей частей состояния) + 8
+# байт. Например, для oh-эмбеддингов сети из 10 узлов с amatrix это
+# 8 * (10 * 3 + 100) + 8 = 1048 байт, для le-эмбеддингов размерности 4 --
+# 8 * 4 * 3 + 8 = 104 байта. PrioritizedMemory добавляет еще 16 байт на
+# переход (дерево сумм).
 class Memory:
-    samples = []
-    idx = 0
+    def __init__(self, capacity):
+        self.capacity = capacity
+
+        self.states = None
+        self.estims = np.zeros(capacity)
+
+        # Самый старый переход и количество переходов
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, estim) -> int:
+        if self.states is None:
+            self.states = [np.zeros((self.capacity,) + np.shape(part),
+                                    dtype=np.asarray(part).dtype)
+                           for part in state]
+
+        if self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+        else:
+            # Вытесняем самый старый переход
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+
+        for arr, part in zip(self.states, state):
+            arr[slot] = part
+        self.estims[slot] = estim
+
+        return slot
+
+    # Выбрать до n случайных переходов. Возвращает места переходов в буфере,
+    # состояния (по массиву на часть), оценки и веса для обучения.
+    def sample(self, n):
+        n = min(n, self.size)
+
+        # Номера по возрасту переходов, от старых к новым
+        ages = random.sample(range(self.size), n)
+        slots = (self.start + np.array(ages, dtype=int)) % self.capacity
+
+        return self.get(slots) + (None,)
+
+    def get(self, slots):
+        return slots, [arr[slots] for arr in self.states], self.estims[slots]
+
+    # Обновить ошибки выбранных переходов после обучения
+    def update(self, slots, errors):
+        pass
+
 
+# Дерево сумм: листья -- приоритеты переходов, в узлах -- суммы поддеревьев
+class SumTree:
     def __init__(self, capacity):
         self.capacity = capacity
+        self.tree = np.zeros(2 * capacity)
 
-    def add(self, sample):
-        self.samples.append((self.idx, sample))
-        self.idx += 1
+    @property
+    def total(self):
+        return self.tree[1]
 
-        if len(self.samples) > self.capacity:
-            self.samples.pop(0)
+    def __getitem__(self, slot):
+        return self.tree[slot + self.capacity]
+
+    def __setitem__(self, slot, priority):
+        i = slot + self.capacity
+        delta = priority - self.tree[i]
+        while i >= 1:
+            self.tree[i] += delta
+            i //= 2
+
+    # Найти лист, на отрезок которого приходится value
+    def find(self, value):
+        i = 1
+        while i < self.capacity:
+            left = 2 * i
+            if value < self.tree[left]:
+                i = left
+            else:
+                value -= self.tree[left]
+                i = left + 1
+
+        return i - self.capacity
+
+
+# Приоритетная память (Schaul et al., Prioritized Experience Replay).
+# Переходы выбираются с вероятностью, пропорциональной (|ошибка| + eps) ^
+# alpha, веса для обучения компенсируют смещение выборки.
+class PrioritizedMemory(Memory):
+    def __init__(self, capacity, alpha=0.6, beta=0.4, eps=1e-3):
+        super().__init__(capacity)
+
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+
+        self.priorities = SumTree(capacity)
+        self.max_priority = 1.0
+
+    def add(self, state, estim) -> int:
+        slot = super().add(state, estim)
+        # Новый переход выбирается хотя бы раз
+        self.priorities[slot] = self.max_priority
+        return slot
 
     def sample(self, n):
-        n = min(n, len(self.samples))
-        return random.sample(self.samples, n)
+        n = min(n, self.size)
+
+        # Выборка по равным отрезкам суммы приоритетов
+        segment = self.priorities.total / n
+        slots = np.array([self.priorities.find(random.uniform(
+                                                  segment * i,
+                                                  segment * (i + 1)))
+                          for i in range(n)], dtype=int)
+        # Из-за округления можно попасть в пустой лист
+        slots = np.minimum(slots, self.size - 1)
+
+        probs = np.array([self.priorities[s] for s in slots]) / \
+            self.priorities.total
+        weights = (self.size * probs) ** -self.beta
+        weights /= weights.max()
+
+        return self.get(slots) + (weights,)
+
+    def update(self, slots, errors):
+        priorities = (np.abs(errors) + self.eps) ** self.alpha
+        for slot, priority in zip(slots, priorities):
+            self.priorities[slot] = priority
+
+        self.max_priority = max(self.max_priority, priorities.max())
+
+
+__memory_clses = {
+    'uniform': Memory,
+    'prioritized': PrioritizedMemory
+}
+
+
+def memory_class(name):
+    return __memory_clses[name]
@@ -5,26 +5,28 @@
 
 # Сообщения-контейнеры (имеют атрибут inner_msg):
 # DelayedMsg(Message)
+# LoopbackMsg(Message)
 # __TransferMsg(Message)
 
 from functools import total_ordering
 
 
-# Базовый класс для всех сообщений в сети
+# Базовый класс для всех сообщений в сети. Поля сообщения хранятся в
+# __slots__, их имена перечислены в fields (вместе с полями базовых
+# классов). Сообщения создаются на каждом шаге пакета, поэтому словаря
+# атрибутов у них нет.
 class Message:
-    def __init__(self, **kwargs):
-        self.content = kwargs
+    __slots__ = ()
+    fields = ()
+
+    # Содержимое в виде словаря, для совместимости
+    @property
+    def content(self):
+        return {name: getattr(self, name) for name in self.fields}
 
     def __str__(self):
         return f'{self.__class__.__name__}: {str(self.content)}'
 
-    # Позволить обращаться к содержимому при помощи атрибутов
-    def __getattr__(self, name):
-        try:
-            return self.content[name]
-        except KeyError:
-            raise AttributeError(name)
-
 
 # Исключение для неподдерживаемых сообщений
 class UnsupportedMsgType(Exception):
@@ -33,45 +35,64 @@ class UnsupportedMsgType(Exception):
 
 # Сообщение, которое должно быть обработано с задержкой
 class DelayedMsg(Message):
+    __slots__ = fields = ('id', 'delay', 'inner_msg')
+
     def __init__(self, id: int, delay: float, inner_msg: Message):
-        super().__init__(id=id, delay=delay, inner_msg=inner_msg)
+        self.id = id
+        self.delay = delay
+        self.inner_msg = inner_msg
 
 
 # Сообщение для немедленного выполнения отложенного сообщения
 class InterruptDelayMsg(Message):
+    __slots__ = fields = ('delay_id',)
+
     def __init__(self, delay_id: int):
-        super().__init__(delay_id=delay_id)
+        self.delay_id = delay_id
+
+
+# Сообщение, которое окружение возвращает на обработку самому роутеру.
+# Вместе с DelayedMsg работает как таймер.
+class LoopbackMsg(Message):
+    __slots__ = fields = ('inner_msg',)
+
+    def __init__(self, inner_msg: Message):
+        self.inner_msg = inner_msg
 
 
 # Сообщение, которое получают все роутеры, когда сеть построена
 class InitMsg(Message):
+    __slots__ = fields = ('config',)
+
     def __init__(self, config):
-        super().__init__(config=config)
+        self.config = config
 
 
 # Сообщение, которое передается между узлами
 class __TransferMsg(Message):
+    __slots__ = fields = ('from_node', 'to_node', 'inner_msg')
+
     def __init__(self,
                  from_node: int,
                  to_node: int,
                  inner_msg: Message):
-        super().__init__(from_node=from_node,
-                         to_node=to_node,
-                         inner_msg=inner_msg)
+        self.from_node = from_node
+        self.to_node = to_node
+        self.inner_msg = inner_msg
 
 
 # Входящее в узел сообщение
 class InMsg(__TransferMsg):
-    pass
+    __slots__ = ()
 
 
 # Исходящее из узла сообщение
 class OutMsg(__TransferMsg):
-    pass
+    __slots__ = ()
 
 
 class ServiceMsg(Message):
-    pass
+    __slots__ = ()
 
 
 @total_ordering  # для вывода остальных операций сравнения
@@ -92,37 +113,75 @@ class Package:
 
 # Сообщение, содержащее пакет
 class PkgMsg(Message):
+    __slots__ = fields = ('pkg',)
+
     def __init__(self, pkg: Package):
-        super().__init__(pkg=pkg)
+        self.pkg = pkg
 
 
 # Сообщение, которое отправляет роутер, если пакет доставлен
 class PkgReceivedMsg(Message):
+    __slots__ = fields = ('pkg',)
+
     def __init__(self, pkg: Package):
-        super().__init__(pkg=pkg)
+        self.pkg = pkg
 
 
 class LinkUpdateMsg(Message):
-    def __init__(self, node: int, direction='both', **kwargs):
-        super().__init__(node=node, direction=direction, **kwargs)
+    __slots__ = fields = ('node', 'direction')
+
+    def __init__(self, node: int, direction='both'):
+        self.node = node
+        self.direction = direction
 
 
 class AddLinkMsg(LinkUpdateMsg):
+    __slots__ = ('edge_data',)
+    fields = LinkUpdateMsg.fields + __slots__
+
     def __init__(self, node: int, direction='both', edge_data={}):
-        super().__init__(node, direction, edge_data=edge_data)
+        super().__init__(node, direction)
+        self.edge_data = edge_data
 
 
 class RemoveLinkMsg(LinkUpdateMsg):
-    def __init__(self, node: int, direction='both'):
-        super().__init__(node, direction)
+    __slots__ = ()
 
 
 # Сообщение для расчета награды
 class RewardMsg(ServiceMsg):
+    __slots__ = fields = ('pkg_id', 'estim', 'reward_data')
+
     def __init__(self, pkg_id: int, estim: float, reward_data):
-        super().__init__(pkg_id=pkg_id, estim=estim, reward_data=reward_data)
+        self.pkg_id = pkg_id
+        self.estim = estim
+        self.reward_data = reward_data
 
 
+# Анонс исходящих ребер узла. Полный анонс (full) заменяет ребра узла,
+# иначе state -- изменения после анонса seq - 1: {сосед: данные ребра или
+# None, если ребро удалено}.
 class StateAnnounMsg(ServiceMsg):
-    def __init__(self, node: int, seq: int, state):
-        super().__init__(node=node, seq=seq, state=state)
+    __slots__ = fields = ('node', 'seq', 'state', 'full')
+
+    def __init__(self, node: int, seq: int, state, full=True):
+        self.node = node
+        self.seq = seq
+        self.state = state
+        self.full = full
+
+
+# Истек таймер удержания анонсов link-state
+class HoldDownMsg(Message):
+    __slots__ = ()
+
+
+# Запрос на расчет оценок модели, который окружение выполняет пакетно. С
+# результатом вызывается callback, он возвращает сообщения для отправки.
+class InferenceMsg(Message):
+    __slots__ = fields = ('model', 'inputs', 'callback')
+
+    def __init__(self, model, inputs, callback):
+        self.model = model
+        self.inputs = inputs
+        self.callback = callback
@@ -1,3 +1,4 @@
 from .common import *
 from .qnetwork import *
 from .nodeenc import *
+from .registry import *
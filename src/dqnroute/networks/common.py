@@ -5,6 +5,7 @@ import torch.nn as nn
 import torch.optim as optim
 
 from ..constants import TORCH_MODELS_DIR
+from .registry import model_registry
 
 __activ_clses = {
     'relu': nn.ReLU,
@@ -47,6 +48,9 @@ class FFNetwork(nn.Sequential):
 
 
 class SaveableModel(nn.Module):
+    # Веса ссылаются на общие тензоры реестра моделей
+    shared_weights = False
+
     def save_path(self):
         return TORCH_MODELS_DIR + '/' + self.label
 
@@ -55,4 +59,11 @@ class SaveableModel(nn.Module):
         return torch.save(self.state_dict(), self.save_path())
 
     def restore(self):
-        return self.load_state_dict(torch.load(self.save_path()))
+        model_registry.restore(self)
+
+    # Скопировать общие веса перед их изменением
+    def own_weights(self):
+        if self.shared_weights:
+            for tensor in self.state_dict(keep_vars=True).values():
+                tensor.data = tensor.data.clone()
+            self.shared_weights = False
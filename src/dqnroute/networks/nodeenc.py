@@ -1,10 +1,14 @@
+import hashlib
 from warnings import warn
+from collections import OrderedDict
 
 import networkx as nx
 import numpy as np
 import scipy.sparse as sp
 import scipy.sparse.linalg
 
+from ..adjacency import AdjacencyMatrix
+
 # Удалять узлы нельзя, можно добавлять новые
 
 
@@ -15,14 +19,13 @@ class NodeEnc:
         self.embs = {}
 
     def fit(self, net_graph):
-        # Эмбеддинги можно обучать по матрице смежности
+        # Эмбеддинги обучаются по матрице смежности. Роутеры передают
+        # AdjacencyMatrix, во время обучения модели матрица смежности
+        # передается в плоском виде.
         if isinstance(net_graph, np.ndarray):
-            # Во время обучения модели матрица смежности передается в плоском
-            # виде
-            if net_graph.ndim == 1:
-                net_graph = net_graph.reshape(int(len(net_graph)**(1/2)), -1)
-
-            net_graph = nx.from_numpy_array(net_graph, create_using=nx.DiGraph)
+            net_graph = AdjacencyMatrix.from_array(net_graph)
+        elif isinstance(net_graph, nx.Graph):
+            net_graph = AdjacencyMatrix.from_graph(net_graph)
 
         self.fit_(net_graph)
 
@@ -41,52 +44,134 @@ class OHNodeEnc(NodeEnc):
     def __init__(self, dim):
         super().__init__(dim)
 
-    def fit_(self, net_graph):
-        nodes = sorted(net_graph)[:self.dim]
+    def fit_(self, amatrix):
+        nodes = amatrix.nodes[:self.dim]
         embs = np.zeros((len(nodes), self.dim))
         embs[range(len(nodes)), nodes] = 1
         self.embs = dict(zip(nodes, embs))
 
 
+# LRU-кэш эмбеддингов
+class EmbCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+
+
+# Отпечаток топологии: узлы, ребра и веса
+def topology_key(amatrix: AdjacencyMatrix, *params) -> bytes:
+    h = hashlib.blake2b(repr(params).encode(), digest_size=16)
+    h.update(np.asarray(amatrix.nodes, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(amatrix.edges).tobytes())
+    h.update(np.ascontiguousarray(amatrix.weights).tobytes())
+    return h.digest()
+
+
 # Laplacian Eigenmap Node Encoder
 class LENodeEnc(NodeEnc):
-    def __init__(self, dim):
+    # Общий для процесса кэш. Роутеры по очереди получают одни и те же
+    # топологии, собственные векторы для каждой считаются один раз.
+    cache = EmbCache(256)
+
+    # Сдвиг при теплом старте
+    warm_sigma = -1e-3
+
+    def __init__(self, dim, warm_start=False, cache=True):
         super().__init__(dim)
 
-    def fit_(self, net_graph):
-        if len(net_graph) <= self.dim + 1:
+        # Теплый старт ищет собственные векторы, начиная с векторов прошлой
+        # топологии, и быстрее сходится. Результат зависит от истории
+        # изменений, поэтому по умолчанию выключен: эмбеддинги при обучении
+        # и симуляции должны совпадать.
+        self.warm_start = warm_start
+        self.use_cache = cache
+
+        self.nodes = None
+        self.vectors = None
+
+    def fit_(self, amatrix):
+        if len(amatrix) <= self.dim + 1:
             return
 
-        # Алогоритм не работает с ориентированными графами
-        net_graph = net_graph.to_undirected()
+        key = None
+        if self.use_cache:
+            key = topology_key(amatrix, self.dim, self.warm_start)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.__set_vectors(amatrix, *cached)
+                return
+
+        L, D, w_avg = self.__laplacian(amatrix)
+
+        vectors = None
+        if self.warm_start and self.nodes == amatrix.nodes:
+            vectors = self.__warm_eigs(L, D)
+        if vectors is None:
+            vectors = self.__cold_eigs(L, D)
+
+        embs = vectors[:, 1:] * w_avg
+        for arr in (vectors, embs):
+            arr.flags.writeable = False
+
+        if key is not None:
+            self.cache.put(key, (vectors, embs))
+
+        self.__set_vectors(amatrix, vectors, embs)
+
+    def __set_vectors(self, amatrix, vectors, embs):
+        self.nodes = list(amatrix.nodes)
+        self.vectors = vectors
+        self.embs = dict(zip(self.nodes, embs))
+
+    def __laplacian(self, amatrix):
+        # Алогоритм не работает с ориентированными графами. Если веса ребер
+        # в двух направлениях разные, берется наибольший.
+        edges = (amatrix.edges + amatrix.edges.T) > 0
+        weights = np.maximum(amatrix.weights, amatrix.weights.T)
 
         # Эмбеддинги на графах, которые отличаются только весом, должны быть
         # разными. Для этого найдем средний вес, на него разделим каждый вес и
         # домножим эмбеддинги.
 
-        w_total = net_graph.size(weight='weight')
-        e_num = net_graph.size(weight=None)
+        upper = np.triu(edges)
+        w_total = weights[upper].sum()
+        e_num = upper.sum()
         w_avg = w_total / e_num
 
-        for u, v in net_graph.edges():
-            net_graph[u][v]['weight'] /= w_avg
-
         # Чем больше вес ребра, тем ближе находятся узлы. Нужно сделать
         # наоборот.
-        for u, v, w in net_graph.edges.data('weight'):
-            net_graph[u][v]['weight'] **= -1
+        A = np.zeros(weights.shape)
+        A[edges] = (weights[edges] / w_avg) ** -1
 
-            # Можно использовать распределение Больцмана с низкой
-            # температурой, чтобы маленькие веса экспоненциально не
-            # увеличивали значение функции.
-            #net_graph[u][v]['weight'] = exp(-w)
+        # Можно использовать распределение Больцмана с низкой
+        # температурой, чтобы маленькие веса экспоненциально не
+        # увеличивали значение функции.
+        #A[edges] = exp(-weights[edges])
 
         # Матрица смежности графа в виде рязряженной матрицы
         # Симметричная, так как граф ненаправленный
-        A = nx.to_scipy_sparse_matrix(
-                net_graph,
-                nodelist=sorted(net_graph),
-                weight='weight')
+        A = sp.csr_matrix(A)
 
         # Суммировать столбцы (вес каждой вершины)
         diags = np.array(A.sum(axis=0))
@@ -95,12 +180,15 @@ class LENodeEnc(NodeEnc):
         # Матрица Кирхгофа
         L = D - A
 
+        return L, D, w_avg
+
+    def __cold_eigs(self, L, D):
         # Начальный вектор должен быть определен, чтобы во время обучения и
         # симуляции получались одинаковые эмбеддинги
         # Вектор из единиц вызывает ошибку в scipy 1.7, в 1.6 возможно будет
         # работать
         v0 = [0.0781944, 0.03992914, 0.0276535, 0.66376005, 0.01232996]
-        v0 = [v0[i % len(v0)] for i in range(A.shape[0])]
+        v0 = [v0[i % len(v0)] for i in range(L.shape[0])]
 
         # Ly = \Dy
         # Ax = wMx
@@ -111,10 +199,28 @@ class LENodeEnc(NodeEnc):
                 which='SM',    # наименьшие значения по модулю (magnitude)
                 v0=v0)
 
-        embs = vectors[:, 1:]
-        embs *= w_avg
-
-        self.embs = dict(zip(sorted(net_graph), embs))
+        return vectors
+
+    def __warm_eigs(self, L, D):
+        # После изменения одного ребра векторы меняются мало. Ищем их
+        # методом Ланцоша со сдвигом около нуля, начиная с суммы прошлых
+        # векторов. Сдвиг отрицательный, так как L вырождена.
+        try:
+            _, vectors = sp.linalg.eigsh(
+                    L.tocsc(),
+                    k=self.dim+1,
+                    M=D.tocsc(),
+                    sigma=self.warm_sigma,
+                    which='LM',
+                    v0=self.vectors[:, 1:].sum(axis=1))
+        except RuntimeError:
+            return None  # например, есть изолированный узел
+
+        # Знак собственного вектора произвольный, выберем как в прошлый раз
+        signs = np.sign(np.sum(vectors * self.vectors, axis=0))
+        signs[signs == 0] = 1
+
+        return vectors * signs
 
 
 __node_enc_clses = {
@@ -40,19 +40,57 @@ class QNetwork(SaveableModel):
         self.ff_net = FFNetwork(in_dim, 1, layers, activ_name)
 
     def forward(self, cur_embs, dst_embs, nbr_embs, *others):
-        #[emb1,
-        # emb2,
-        # emb3]
+        return self.ff_net(self.prepare(cur_embs, dst_embs, nbr_embs, *others))
 
-        if self.embs_name != 'oh':
-            lay_inp = [dst_embs - cur_embs, nbr_embs - cur_embs]
-        else:
-            lay_inp = [cur_embs, dst_embs, nbr_embs]
-
-        for inp, other in zip(self.addit_inputs, others):
-            if inp['name'] == 'amatrix':
-                other[other > 0] = 1
-                lay_inp.append(other)
+    # Собрать входной тензор сети. Его можно сохранить и передавать в
+    # forward_input, пока состояние не изменилось.
+    def prepare(self, cur_embs, dst_embs, nbr_embs, *others):
+        return prepare_input(self.embs_name, self.addit_inputs,
+                             cur_embs, dst_embs, nbr_embs, *others)
 
-        lay_inp = tch.tensor(np.concatenate(lay_inp, axis=1), dtype=tch.float)
+    def forward_input(self, lay_inp):
         return self.ff_net(lay_inp)
+
+
+# Входной тензор QNetwork по батчу эмбеддингов (по строке на пример)
+def prepare_input(embs_name, addit_inputs, cur_embs, dst_embs, nbr_embs,
+                  *others):
+    #[emb1,
+    # emb2,
+    # emb3]
+
+    if embs_name != 'oh':
+        lay_inp = [dst_embs - cur_embs, nbr_embs - cur_embs]
+    else:
+        lay_inp = [cur_embs, dst_embs, nbr_embs]
+
+    for inp, other in zip(addit_inputs, others):
+        if inp['name'] == 'amatrix':
+            lay_inp.append(np.where(other > 0, 1, other))
+
+    return tch.tensor(np.concatenate(lay_inp, axis=1), dtype=tch.float)
+
+
+# Прямой проход нескольких моделей одной архитектуры (одинаковый label)
+# одной операцией: веса моделей складываются в стопку, входы моделей
+# дополняются до одинакового числа строк. Вернуть выход каждой модели.
+# Результат совпадает с forward_input каждой модели с точностью до
+# округления float32 (порядок суммирования в baddbmm другой).
+def forward_stacked(models, inputs):
+    if len(models) == 1:
+        return [models[0].forward_input(inputs[0])]
+
+    rows = max(len(inp) for inp in inputs)
+    x = inputs[0].new_zeros((len(inputs), rows, inputs[0].shape[1]))
+    for i, inp in enumerate(inputs):
+        x[i, :len(inp)] = inp
+
+    for layers in zip(*[model.ff_net for model in models]):
+        if isinstance(layers[0], tch.nn.Linear):
+            weights = tch.stack([layer.weight for layer in layers])
+            biases = tch.stack([layer.bias for layer in layers])
+            x = tch.baddbmm(biases.unsqueeze(1), x, weights.transpose(1, 2))
+        else:
+            x = layers[0](x)  # активация, dropout
+
+    return [x[i, :len(inp)] for i, inp in enumerate(inputs)]
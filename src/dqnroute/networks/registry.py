@@ -0,0 +1,55 @@
+import torch
+
+
+# Реестр предобученных моделей процесса. Файл каждой модели читается один
+# раз, начальные веса хранятся в общей памяти, поэтому их можно передать
+# пулу процессов (dqnroute.runner). Модели роутеров ссылаются на общие
+# веса, пока не начнут обучаться (SaveableModel.own_weights), роутеры без
+# обучения используют общий модуль.
+class ModelRegistry:
+    def __init__(self):
+        self.states = {}
+        self.modules = {}
+
+    # Веса модели из файла path в общей памяти
+    def state(self, path):
+        if path not in self.states:
+            state = torch.load(path)
+            for tensor in state.values():
+                tensor.share_memory_()
+            self.states[path] = state
+
+        return self.states[path]
+
+    # Добавить веса, загруженные в другом процессе
+    def update(self, states):
+        self.states.update(states)
+
+    # Загрузить веса в модель без копирования
+    def restore(self, model):
+        state = self.state(model.save_path())
+
+        tensors = model.state_dict(keep_vars=True)
+        if tensors.keys() != state.keys():
+            raise RuntimeError('Unexpected model state: ' + model.label)
+
+        for name, tensor in tensors.items():
+            if tensor.shape != state[name].shape:
+                raise RuntimeError(f'Size mismatch for {name} in model '
+                                   f'{model.label}')
+            tensor.data = state[name]
+
+        model.shared_weights = True
+
+    # Общий модуль для моделей с тем же файлом. Первая запрошенная модель
+    # загружается и становится общей.
+    def shared_module(self, model):
+        path = model.save_path()
+        if path not in self.modules:
+            self.restore(model)
+            self.modules[path] = model
+
+        return self.modules[path]
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,187 @@
+import time
+import argparse
+
+import numpy as np
+import torch as tch
+import torch.nn as nn
+from torch.utils.data import Dataset, DataLoader, BatchSampler, \
+    RandomSampler, SequentialSampler
+
+from .utils import set_random_seed
+from .networks import *
+from .pretraindata import *
+
+
+# Примеры для предобучения QNetwork. Эмбеддинги считаются один раз для
+# каждой топологии и хранятся таблицей (T, N, dim) по позициям узлов в
+# матрице смежности. Элемент выборки -- целый батч: __getitem__ получает
+# список номеров примеров от BatchSampler и собирает входной тензор
+# векторно, поэтому DataLoader создается с batch_size=None.
+class PretrainDataset(Dataset):
+    def __init__(self,
+                 data: PretrainData,
+                 embs_cfg: dict,
+                 addit_inputs=[],
+                 idxs=None):
+        self.data = data
+        self.embs_name = embs_cfg['name']
+        self.addit_inputs = addit_inputs
+        self.idxs = np.arange(len(data)) if idxs is None else \
+            np.asarray(idxs)
+
+        self.nodes = np.array(data.nodes)
+
+        NodeEnc = node_encoder_class(self.embs_name)
+        params = {k: v for k, v in embs_cfg.items() if k != 'name'}
+
+        embs = []
+        for topology in range(len(data.topologies)):
+            node_enc = NodeEnc(**params)
+            node_enc.fit(data.amatrix(topology))
+            embs.append([node_enc.encode(i) for i in range(len(self.nodes))])
+
+        self.embs = np.array(embs, dtype=float).reshape(
+                len(data.topologies), len(self.nodes), -1)
+
+        # Топологий мало, матрицы смежности читаются в память один раз
+        self.amatrices = np.asarray(data.topologies).reshape(
+                len(data.topologies), -1)
+
+    def __len__(self):
+        return len(self.idxs)
+
+    def __getitem__(self, batch_idxs):
+        samples = self.data.samples[self.idxs[batch_idxs]]
+        topologies = samples['topology']
+
+        def embs(field):
+            pos = np.searchsorted(self.nodes, samples[field])
+            return self.embs[topologies, pos]
+
+        others = []
+        for inp in self.addit_inputs:
+            if inp['name'] == 'amatrix':
+                others.append(self.amatrices[topologies])
+
+        inputs = prepare_input(self.embs_name, self.addit_inputs,
+                               embs('src'), embs('dst'), embs('nbr'),
+                               *others)
+        targets = tch.tensor(np.ascontiguousarray(samples['estim']),
+                             dtype=tch.float).unsqueeze(1)
+
+        return inputs, targets
+
+
+def pretrain_loader(dataset: PretrainDataset,
+                    batch_size=64,
+                    shuffle=True,
+                    num_workers=0,
+                    prefetch_factor=2) -> DataLoader:
+    Sampler = RandomSampler if shuffle else SequentialSampler
+    sampler = BatchSampler(Sampler(dataset), batch_size, drop_last=False)
+
+    # prefetch_factor допустим только с процессами-загрузчиками
+    params = {}
+    if num_workers > 0:
+        params = {'prefetch_factor': prefetch_factor,
+                  'persistent_workers': True}
+
+    return DataLoader(dataset,
+                      sampler=sampler,
+                      batch_size=None,
+                      num_workers=num_workers,
+                      **params)
+
+
+# Эпоха с оптимизацией, вернуть средний по батчам loss
+def pretrain_epoch(model, optimizer, loader):
+    loss_fn = nn.MSELoss()
+
+    loss_sum = 0
+    loss_num = 0
+    for inputs, targets in loader:
+        # Обнулить градиент, который накапливается во время обратного прохода
+        optimizer.zero_grad()
+
+        loss = loss_fn(model.forward_input(inputs), targets)
+        loss.backward()
+
+        # Обновить параметры модели
+        optimizer.step()
+
+        loss_sum += loss.item()
+        loss_num += 1
+
+    return loss_sum / max(loss_num, 1)
+
+
+def pretrain(model, loader, optim_name, epoch_num, lr=0.001,
+             need_save=True):
+    optimizer = optim_class(optim_name)(model.parameters(), lr=lr)
+
+    epoch_losses = []
+    for epoch in range(epoch_num):
+        start = time.perf_counter()
+        loss = pretrain_epoch(model, optimizer, loader)
+        print(f'epoch {epoch + 1}: loss {loss:.4f}, '
+              f'{time.perf_counter() - start:.1f} s')
+        epoch_losses.append(loss)
+
+    if need_save:
+        model.save()
+
+    return epoch_losses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QNetwork pre-training')
+    parser.add_argument('data', type=str,
+                        help='Path to pretrain data directory')
+    parser.add_argument('--embeddings', type=str, default='le',
+                        help='Node encoder: oh or le')
+    parser.add_argument('--dim', type=int, default=4,
+                        help='Embedding dimension (ignored for oh)')
+    parser.add_argument('--amatrix', action='store_true',
+                        help='Add adjacency matrix to network input')
+    parser.add_argument('--layers', type=int, nargs='+', default=[64, 64])
+    parser.add_argument('--activation', type=str, default='relu')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--optimizer', type=str, default='rmsprop')
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Number of data loader processes')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='Batches prefetched by each loader process')
+    parser.add_argument('--seed', type=int, default=40)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    set_random_seed(args.seed)
+
+    data = load_pretrain_data(args.data)
+
+    embs_cfg = {'name': args.embeddings, 'dim': args.dim}
+    addit_inputs = [{'name': 'amatrix'}] if args.amatrix else []
+    model = QNetwork(len(data.nodes),
+                     args.layers,
+                     args.activation,
+                     embs_cfg,
+                     addit_inputs)
+    print(model.label)
+
+    dataset = PretrainDataset(data, embs_cfg, addit_inputs)
+    loader = pretrain_loader(dataset,
+                             args.batch_size,
+                             num_workers=args.workers,
+                             prefetch_factor=args.prefetch)
+
+    pretrain(model, loader, args.optimizer, args.epochs, args.lr,
+             need_save=not args.no_save)
+
+    if not args.no_save:
+        print('Saved to ' + model.save_path())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from .utils import get_multi_col
+
+# Данные для предобучения хранятся в каталоге:
+#   meta.json       -- узлы сети и количество примеров;
+#   topologies.npy  -- различные матрицы смежности (с весами), (T, N, N);
+#   samples.bin     -- примеры подряд, тип SAMPLE_DTYPE, в узлах src --
+#                      текущий узел, topology -- номер матрицы смежности.
+# Примеры дописываются частями и читаются через memmap.
+
+FORMAT_VERSION = 1
+
+SAMPLE_DTYPE = np.dtype([
+    ('dst', np.int32),
+    ('src', np.int32),
+    ('pkg_id', np.int32),
+    ('nbr', np.int32),
+    ('topology', np.int32),
+    ('estim', np.float64)
+])
+
+
+class PretrainDataWriter:
+    def __init__(self, path: str, nodes: list):
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.nodes = sorted(nodes)
+        self.topologies = []
+        self.topology_ids = {}
+        self.size = 0
+
+        self.file = open(os.path.join(path, 'samples.bin'), 'wb')
+
+    # Добавить матрицу смежности, вернуть ее номер. Одинаковые матрицы
+    # хранятся один раз.
+    def add_topology(self, amatrix: np.ndarray) -> int:
+        amatrix = np.asarray(amatrix, dtype=np.float64).reshape(
+                len(self.nodes), len(self.nodes))
+
+        key = amatrix.tobytes()
+        if key not in self.topology_ids:
+            self.topology_ids[key] = len(self.topologies)
+            self.topologies.append(amatrix)
+
+        return self.topology_ids[key]
+
+    def add(self, samples: np.ndarray):
+        samples = np.asarray(samples, dtype=SAMPLE_DTYPE)
+        self.file.write(samples.tobytes())
+        self.size += len(samples)
+
+    def close(self):
+        self.file.close()
+
+        n = len(self.nodes)
+        np.save(os.path.join(self.path, 'topologies.npy'),
+                np.array(self.topologies).reshape(-1, n, n))
+
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump({'version': FORMAT_VERSION,
+                       'nodes': self.nodes,
+                       'samples': self.size}, f)
+
+
+class PretrainData:
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        if meta['version'] != FORMAT_VERSION:
+            raise Exception('Unsupported pretrain data version: ' +
+                            str(meta['version']))
+
+        self.nodes = meta['nodes']
+        self.topologies = np.load(os.path.join(path, 'topologies.npy'),
+                                  mmap_mode='r')
+
+        size = meta['samples']
+        if size > 0:
+            self.samples = np.memmap(os.path.join(path, 'samples.bin'),
+                                     dtype=SAMPLE_DTYPE,
+                                     mode='r',
+                                     shape=(size,))
+        else:
+            self.samples = np.zeros(0, dtype=SAMPLE_DTYPE)
+
+    def __len__(self):
+        return len(self.samples)
+
+    # Плоская матрица смежности, как в столбцах amatrix_* CSV
+    def amatrix(self, topology: int) -> np.ndarray:
+        return np.asarray(self.topologies[topology]).flatten()
+
+    # Примеры в виде таблицы CSV (со столбцами amatrix_*)
+    def to_frame(self, start=0, end=None) -> pd.DataFrame:
+        samples = self.samples[start:end]
+        n = len(self.nodes)
+
+        df = pd.DataFrame({
+            'dst': samples['dst'].astype(float),
+            'src': samples['src'].astype(float),
+            'pkg_id': samples['pkg_id'].astype(float),
+            'nbr': samples['nbr'].astype(float)
+        }, index=pd.RangeIndex(start, start + len(samples)))
+
+        amatrices = np.asarray(self.topologies).reshape(-1, n * n)
+        amatrix_df = pd.DataFrame(amatrices[samples['topology']],
+                                  columns=get_multi_col('amatrix', n * n),
+                                  index=df.index)
+
+        return pd.concat([df, amatrix_df,
+                          pd.Series(samples['estim'], name='estim',
+                                    index=df.index)], axis=1)
+
+
+def load_pretrain_data(path: str) -> PretrainData:
+    return PretrainData(path)
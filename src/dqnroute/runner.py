@@ -0,0 +1,198 @@
+import os
+import time
+import argparse
+import itertools
+import importlib.util
+from copy import deepcopy
+from functools import partial
+
+import yaml
+import pandas as pd
+import torch as tch
+import torch.multiprocessing as mp
+
+from . import delivperiods
+from .simulation import get_network_env_class
+from .networks import QNetwork, model_registry
+
+# Запуск серии экспериментов: типы роутеров x сиды x варианты настроек.
+# Эксперименты выполняются пулом процессов forkserver, в котором torch и
+# dqnroute импортированы заранее. Предобученные модели загружаются один раз
+# и передаются процессам в общей памяти. Каждый эксперимент сразу пишет
+# таблицу интервалов в свой файл каталога результатов.
+
+PERIOD_AGGRS = ['count', 'sum', 'min', 'max']
+
+
+class Job:
+    def __init__(self, router_type, seed, variant, overrides):
+        self.router_type = router_type
+        self.seed = seed
+        self.variant = variant
+        self.overrides = overrides
+
+    def name(self):
+        return f'{self.router_type}_{self.seed}_{self.variant}'
+
+
+# Разобрать переопределения вида settings.router.dqn.batch_size=16.
+# Несколько значений одного ключа дают несколько вариантов, варианты
+# образуют декартово произведение по ключам.
+def parse_overrides(items):
+    values = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError('Override must be KEY=VALUE: ' + item)
+
+        values.setdefault(key, []).append(yaml.safe_load(value))
+
+    return [dict(zip(values, combo))
+            for combo in itertools.product(*values.values())]
+
+
+def apply_overrides(run_params, overrides):
+    run_params = deepcopy(run_params)
+    for key, value in overrides.items():
+        *path, last = key.split('.')
+        node = run_params
+        for part in path:
+            node = node.setdefault(part, {})
+        node[last] = value
+
+    return run_params
+
+
+# Пути к моделям, которые загрузят роутеры эксперимента
+def model_paths(run_params, router_type):
+    router_cfg = run_params['settings']['router'].get(router_type, {})
+    if 'embeddings' not in router_cfg:
+        return []
+
+    nodes = {e[k] for e in run_params['network'] for k in ('u', 'v')}
+    model = QNetwork(len(nodes),
+                     router_cfg['layers'],
+                     router_cfg['activation'],
+                     deepcopy(router_cfg['embeddings']),
+                     deepcopy(router_cfg.get('addit_inputs', [])))
+    return [model.save_path()]
+
+
+def preload_models(paths):
+    return {path: model_registry.state(path)
+            for path in paths if os.path.exists(path)}
+
+
+def init_worker(states):
+    model_registry.update(states)
+
+
+def run_job(run_params, kernel, out_dir, fmt, job):
+    run_params = apply_overrides(run_params, job.overrides)
+    periods = delivperiods.create_periods(
+            run_params['settings']['period_dur'], PERIOD_AGGRS)
+    net_env = get_network_env_class(kernel)(run_params=run_params,
+                                            router_type=job.router_type,
+                                            deliv_periods=periods)
+
+    start = time.perf_counter()
+    net_env.run(job.seed)
+    wall = time.perf_counter() - start
+
+    df = periods.get_periods()
+    df['avg'] = df['sum'] / df['count']
+    df['router_type'] = job.router_type
+    df['seed'] = job.seed
+    df['variant'] = job.variant
+    for key, value in job.overrides.items():
+        df[key] = str(value)
+
+    path = os.path.join(out_dir, f'{job.name()}.{fmt}')
+    if fmt == 'parquet':
+        df.to_parquet(path)
+    else:
+        df.to_csv(path)
+
+    return job, path, wall
+
+
+# Объединить результаты из каталога в одну таблицу
+def load_results(out_dir) -> pd.DataFrame:
+    dfs = []
+    for name in sorted(os.listdir(out_dir)):
+        path = os.path.join(out_dir, name)
+        if name.endswith('.parquet'):
+            dfs.append(pd.read_parquet(path))
+        elif name.endswith('.csv'):
+            dfs.append(pd.read_csv(path, index_col=0))
+
+    return pd.concat(dfs, axis=0)
+
+
+def run_jobs(run_params,
+             jobs,
+             kernel='fast',
+             out_dir='results',
+             fmt='csv',
+             processes=None):
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for job in jobs:
+        paths += model_paths(apply_overrides(run_params, job.overrides),
+                             job.router_type)
+    states = preload_models(paths)
+
+    ctx = mp.get_context('forkserver')
+    ctx.set_forkserver_preload(['torch', 'dqnroute'])
+
+    with ctx.Pool(processes, initializer=init_worker,
+                  initargs=(states,)) as pool:
+        # Результаты приходят по мере завершения экспериментов
+        run = partial(run_job, run_params, kernel, out_dir, fmt)
+        for job, path, wall in pool.imap_unordered(run, jobs):
+            print(f'{job.name()}: {wall:.1f} s -> {path}')
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run simulations for router types, seeds and settings')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('--routers', type=str, nargs='+', required=True)
+    parser.add_argument('--seeds', type=int, nargs='+', default=[42])
+    parser.add_argument('--set', type=str, action='append', default=[],
+                        metavar='KEY=VALUE',
+                        help='Launch file override, e.g. '
+                             'settings.router.dqn.batch_size=16; repeat a '
+                             'key to sweep its values')
+    parser.add_argument('--kernel', type=str, default='fast')
+    parser.add_argument('--out', type=str, default='results',
+                        help='Directory for per-job results')
+    parser.add_argument('--format', type=str, choices=['parquet', 'csv'],
+                        help='Default is parquet if pyarrow is installed')
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'parquet' if importlib.util.find_spec('pyarrow') else 'csv'
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    jobs = []
+    for variant, overrides in enumerate(parse_overrides(args.set)):
+        for router_type in args.routers:
+            for seed in args.seeds:
+                jobs.append(Job(router_type, seed, variant, overrides))
+
+    start = time.perf_counter()
+    for _ in run_jobs(run_params, jobs, args.kernel, args.out, fmt,
+                      args.processes):
+        pass
+    print(f'{len(jobs)} jobs in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import sys
+import random
+import argparse
+from copy import deepcopy
+
+import yaml
+import networkx as nx
+
+# Генерация больших сценариев: топология сети и расписание трафика со
+# штормами отказов линков. Результат -- словарь в формате файла запуска,
+# его можно сразу передать в NetworkEnv как run_params или сохранить в YAML.
+
+# Настройки роутеров как в launches/*.yaml
+DEFAULT_SETTINGS = {
+    'period_dur': 500,
+    'pkg_size': 1000,
+    'router_env': {
+        'pkg_proc_delay': 5
+    },
+    'router': {
+        'q': {
+            'lr': 0.5
+        },
+        'dqn': {
+            'optimizer': {'name': 'rmsprop', 'lr': 0.001},
+            'batch_size': 1,
+            'mem_capacity': 1,
+            'layers': [64, 64],
+            'activation': 'relu',
+            'embeddings': {'name': 'oh'},
+            'addit_inputs': [{'name': 'amatrix'}]
+        },
+        'dqn_le': {
+            'optimizer': {'name': 'rmsprop', 'lr': 0.001},
+            'batch_size': 1,
+            'mem_capacity': 1,
+            'layers': [64, 64],
+            'activation': 'relu',
+            'embeddings': {'name': 'le', 'dim': 4},
+            'addit_inputs': []
+        }
+    }
+}
+
+
+def grid(rows=32, cols=32, seed=None):
+    graph = nx.grid_2d_graph(rows, cols)
+    return nx.convert_node_labels_to_integers(graph, ordering='sorted')
+
+
+# Fat-tree из k-портовых коммутаторов: (k/2)^2 ядра, k подов по k/2
+# коммутаторов агрегации и доступа, k/2 хостов у каждого коммутатора
+# доступа (если hosts)
+def fat_tree(k=8, hosts=True, seed=None):
+    if k % 2 != 0:
+        raise ValueError('Fat-tree k must be even: ' + str(k))
+
+    half = k // 2
+    graph = nx.Graph()
+    next_id = iter(range(sys.maxsize))
+
+    cores = [[next(next_id) for _ in range(half)] for _ in range(half)]
+    for _ in range(k):
+        aggrs = [next(next_id) for _ in range(half)]
+        edges = [next(next_id) for _ in range(half)]
+
+        for i, aggr in enumerate(aggrs):
+            for core in cores[i]:
+                graph.add_edge(core, aggr)
+            for edge in edges:
+                graph.add_edge(aggr, edge)
+
+        if hosts:
+            for edge in edges:
+                for _ in range(half):
+                    graph.add_edge(edge, next(next_id))
+
+    return graph
+
+
+def barabasi_albert(nodes=1000, m=2, seed=None):
+    return nx.barabasi_albert_graph(nodes, m, seed=seed)
+
+
+# Граф Ваксмана. Каждая компонента связности, кроме наибольшей,
+# соединяется с ней ребром между случайными узлами обеих компонент.
+def waxman(nodes=1000, beta=0.4, alpha=0.1, seed=None):
+    graph = nx.waxman_graph(nodes, beta=beta, alpha=alpha, seed=seed)
+
+    comps = sorted(nx.connected_components(graph), key=len, reverse=True)
+    rand = random.Random(seed)
+    for comp in comps[1:]:
+        graph.add_edge(rand.choice(sorted(comp)),
+                       rand.choice(sorted(comps[0])))
+
+    # Позиции узлов не нужны в файле запуска
+    for _, data in graph.nodes(data=True):
+        data.clear()
+
+    return graph
+
+
+__topology_fns = {
+    'grid': grid,
+    'fat_tree': fat_tree,
+    'barabasi_albert': barabasi_albert,
+    'waxman': waxman
+}
+
+
+def get_topology(name, **params) -> nx.Graph:
+    return __topology_fns[name](**params)
+
+
+# Ребра сети для файла запуска. bandwidth -- число или список, из которого
+# пропускная способность выбирается случайно.
+def make_network(graph, bandwidth=100, seed=None):
+    rand = random.Random(seed)
+
+    network = []
+    for u, v in sorted(tuple(sorted(e)) for e in graph.edges):
+        bw = rand.choice(bandwidth) if isinstance(bandwidth, list) \
+            else bandwidth
+        network.append({'u': u, 'v': v, 'bandwidth': bw})
+
+    return network
+
+
+# Выбрать линки для шторма отказов. Сеть должна остаться связной, иначе
+# роутерам некуда отправить пакет.
+def pick_failures(graph, num, rand):
+    graph = graph.copy()
+
+    failures = []
+    candidates = sorted(tuple(sorted(e)) for e in graph.edges)
+    rand.shuffle(candidates)
+    for u, v in candidates:
+        if len(failures) == num:
+            break
+
+        graph.remove_edge(u, v)
+        if nx.has_path(graph, u, v):
+            failures.append((u, v))
+        else:
+            graph.add_edge(u, v)
+
+    return failures
+
+
+# Расписание pkg_distr: pkgs пакетов с интервалом delay. Трафик делится на
+# storms + 1 равных частей, между частями storm_links линков одновременно
+# обрываются, через storm_pkgs пакетов восстанавливаются.
+def make_traffic(graph,
+                 pkgs=10**6,
+                 delay=1,
+                 storms=0,
+                 storm_links=10,
+                 storm_pkgs=1000,
+                 srcs=None,
+                 dsts=None,
+                 seed=None):
+    rand = random.Random(seed)
+
+    def send(num):
+        seq = {'num': num, 'delay': delay}
+        if srcs is not None:
+            seq['srcs'] = srcs
+        if dsts is not None:
+            seq['dsts'] = dsts
+        return [seq] if num > 0 else []
+
+    storm_pkgs = min(storm_pkgs, pkgs // max(storms, 1))
+    calm_pkgs = pkgs - storms * storm_pkgs
+
+    pkg_distr = []
+    for i in range(storms + 1):
+        num = calm_pkgs // (storms + 1) + \
+            (1 if i < calm_pkgs % (storms + 1) else 0)
+        pkg_distr += send(num)
+
+        if i == storms:
+            break
+
+        failures = pick_failures(graph, storm_links, rand)
+        pkg_distr += [{'action': 'break_link', 'pause': 0, 'u': u, 'v': v}
+                      for u, v in failures]
+        pkg_distr += send(storm_pkgs)
+        pkg_distr += [{'action': 'restore_link', 'pause': 0, 'u': u, 'v': v}
+                      for u, v in failures]
+
+    return pkg_distr
+
+
+def make_launch(graph, pkg_distr, bandwidth=100, settings=None,
+                seed=None) -> dict:
+    settings = deepcopy(DEFAULT_SETTINGS if settings is None else settings)
+    settings['pkg_distr'] = pkg_distr
+
+    return {'network': make_network(graph, bandwidth, seed),
+            'settings': settings}
+
+
+def parse_params(items):
+    params = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        params[key] = yaml.safe_load(value)
+
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Large synthetic launch file generator')
+    parser.add_argument('topology', type=str,
+                        help='grid, fat_tree, barabasi_albert or waxman')
+    parser.add_argument('output', type=str, help='Path to launch file')
+    parser.add_argument('--param', type=str, action='append', default=[],
+                        metavar='KEY=VALUE',
+                        help='Topology parameter, e.g. nodes=5000')
+    parser.add_argument('--bandwidth', type=int, nargs='+', default=[100])
+    parser.add_argument('--pkgs', type=int, default=10**6)
+    parser.add_argument('--delay', type=int, default=1)
+    parser.add_argument('--storms', type=int, default=0)
+    parser.add_argument('--storm-links', type=int, default=10)
+    parser.add_argument('--storm-pkgs', type=int, default=1000)
+    parser.add_argument('--settings-from', type=str,
+                        help='Take router settings from launch file')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    graph = get_topology(args.topology, seed=args.seed,
+                         **parse_params(args.param))
+
+    settings = None
+    if args.settings_from is not None:
+        with open(args.settings_from) as f:
+            settings = yaml.safe_load(f)['settings']
+
+    bandwidth = args.bandwidth[0] if len(args.bandwidth) == 1 \
+        else args.bandwidth
+    pkg_distr = make_traffic(graph,
+                             args.pkgs,
+                             args.delay,
+                             args.storms,
+                             args.storm_links,
+                             args.storm_pkgs,
+                             seed=args.seed)
+    launch = make_launch(graph, pkg_distr, bandwidth, settings, args.seed)
+
+    with open(args.output, 'w') as f:
+        yaml.safe_dump(launch, f, default_flow_style=None, sort_keys=False)
+
+    print(f'{len(graph)} nodes, {graph.number_of_edges()} links, '
+          f'{args.pkgs} packets, {args.storms} failure storms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,18 @@
 from .network import *
 from .compnet import *
+from .fastsim import *
+
+
+class UnsupportedKernel(Exception):
+    pass
+
+__network_env_clses = {
+    'simpy': ComputerNetEnv,
+    'fast': FastComputerNetEnv
+}
+
+def get_network_env_class(kernel: str):
+    try:
+        return __network_env_clses[kernel]
+    except KeyError:
+        raise UnsupportedKernel(kernel)
@@ -1,80 +1,104 @@
 import logging
+from functools import partial
 
 import networkx as nx
 from simpy import Environment, Event, Resource, Process
 
 from .network import *
+from .inference import *
 from ..messages import *
 from ..delivperiods import *
 from ..agents import *
 from ..constants import *
 from ..utils import *
+from ..traffic import Schedule, get_schedule
 
 logger = logging.getLogger(MAIN_LOGGER)
 
 
+# Линк к соседу: пропускная способность, очередь передачи пакетов и
+# окружение роутера соседа
+class Link:
+    __slots__ = ('bandwidth', 'resource', 'peer')
+
+    def __init__(self, bandwidth, resource, peer):
+        self.bandwidth = bandwidth
+        self.resource = resource
+        self.peer = peer
+
+
 class RouterEnv(NodeEnv):
     def __init__(self,
                  env: Environment,
                  router,
                  node: int,
                  deliv_periods: DelivPeriods,
-                 local_graph: nx.DiGraph,
-                 pkg_proc_delay: int):
+                 pkg_proc_delay: int,
+                 inference: InferenceService = None):
         super().__init__(env, router)
 
         self.id = node
         self.deliv_periods = deliv_periods
-        self.local_graph = local_graph
         self.pkg_proc_delay = pkg_proc_delay
+        # Линки к соседям {сосед: Link}, заполняет ComputerNetEnv
+        self.links = {}
+        self.inference = inference
 
         self.msg_proc_queue = Resource(self.env, capacity=1)
 
-    def msg_event(self, msg: Message) -> Event:
-        if isinstance(msg, (InitMsg, AddLinkMsg, RemoveLinkMsg)):
-            # Достаточно только обработать роутером
+    @handles('event', InitMsg, AddLinkMsg, RemoveLinkMsg, HoldDownMsg)
+    def router_only_event(self, msg: Message) -> Event:
+        # Достаточно только обработать роутером
 
-            return self.env.event().succeed()
-        elif isinstance(msg, OutMsg):
-            # Отправляем сообщение
+        return self.env.event().succeed()
 
-            return self.env.process(self.__edge_transfer(msg))
-        elif isinstance(msg, InMsg):
-            # Принимаем сообщение
+    @handles('event', OutMsg)
+    def out_event(self, msg: OutMsg) -> Event:
+        # Отправляем сообщение
 
-            return self.env.process(self.__input_queue(msg))
-        elif isinstance(msg, PkgReceivedMsg):
-            # Пакет доставлен
+        return self.env.process(self.__edge_transfer(msg))
 
-            logger.debug((f'Package #{msg.pkg.id} received '
-                          f'at node {self.id} at time {self.env.now}'))
-            self.deliv_periods.register(msg.pkg.start_time, self.env.now)
-            return self.env.event().succeed()
-        else:
-            return super().msg_event(msg)
+    @handles('event', InMsg)
+    def in_event(self, msg: InMsg) -> Event:
+        # Принимаем сообщение
+
+        return self.env.process(self.__input_queue(msg))
+
+    @handles('event', PkgReceivedMsg)
+    def received_event(self, msg: PkgReceivedMsg) -> Event:
+        # Пакет доставлен
+
+        logger.debug((f'Package #{msg.pkg.id} received '
+                      f'at node {self.id} at time {self.env.now}'))
+        self.deliv_periods.register(msg.pkg.start_time, self.env.now)
+        return self.env.event().succeed()
+
+    @handles('event', InferenceMsg)
+    def inference_event(self, msg: InferenceMsg) -> Event:
+        # Ответ будет отправлен после пакетного расчета
+
+        self.inference.submit(msg, self)
+        return self.env.event().succeed()
 
     def __edge_transfer(self, msg):
-        #print(self.local_graph.edges)
         #print(msg)
-        edge_data = self.local_graph.edges[self.id, msg.to_node]
-        nbr_router_env = self.local_graph.nodes[msg.to_node]['router_env']
-        new_msg = InMsg(**msg.content)
+        link = self.links[msg.to_node]
+        new_msg = InMsg(msg.from_node, msg.to_node, msg.inner_msg)
         inner_msg = msg.inner_msg
 
         # Сервисные сообщения не засоряют канал
         if isinstance(inner_msg, ServiceMsg):
-            nbr_router_env.receive(new_msg)
+            link.peer.receive(new_msg)
         elif isinstance(inner_msg, PkgMsg):
             pkg = inner_msg.pkg
             logger.debug(
                     f'Package #{pkg.id} hop: {msg.from_node} -> {msg.to_node}')
 
-            bw = edge_data['bandwidth']
-            with edge_data['resource'].request() as req:
+            with link.resource.request() as req:
                 yield req
-                yield self.env.timeout(pkg.size / bw)
+                yield self.env.timeout(pkg.size / link.bandwidth)
 
-            nbr_router_env.receive(new_msg)
+            link.peer.receive(new_msg)
         else:
             raise UnsupportedMessageType(inner_msg)
 
@@ -93,10 +117,21 @@ class RouterEnv(NodeEnv):
 
 # Окружение для симуляции компьютерной сети
 class ComputerNetEnv(NetworkEnv):
+    router_env_class = RouterEnv
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         RouterClass = get_router_class(self.router_type)
+
+        # Пакетный расчет оценок включается в настройках роутера
+        inference_cfg = self.run_params['settings']['router'].get(
+                self.router_type, {}).get('inference')
+        self.inference = None if inference_cfg is None else \
+            InferenceService(self.call_later, **inference_cfg)
+
+        self.router_envs = {}
+
         # (node, {nbr: edge_data, ...}) ...
         # Получаем исходящих соседей каждого узла
         for node, nbrs in self.graph.adjacency():
@@ -109,13 +144,13 @@ class ComputerNetEnv(NetworkEnv):
             for u, v in list(local_graph.edges):
                 router_graph.add_edge(u, v, **self.__copy_edge_data(u, v))
 
-            router = RouterClass(get_time=lambda: self.env.now,
+            router = RouterClass(get_time=self.get_time,
                                  id=node,
                                  router_graph=router_graph,
                                  **router_cfg)
 
             # Окружение сети имеет граф сети, окружение роутера имеет
-            # локальный подграф с исходящими соседями, роутер имеет копию
+            # таблицу линков к исходящим соседям, роутер имеет копию
             # локального подграфа с исходящими соседями. Исходящие соседи в
             # компьютерной сети вактически являются всеми соседями. Не может
             # быть входящего линка без исходящего
@@ -123,22 +158,56 @@ class ComputerNetEnv(NetworkEnv):
             # Удаление линка не изменяет структуру графа, но изменяет список
             # соседей роутера
 
-            self.graph.nodes[node]['router_env'] = RouterEnv(
+            router_env = self.router_env_class(
                     self.env,
                     router,
                     node,
                     self.deliv_periods,
-                    local_graph,
+                    inference=self.inference,
                     **self.run_params['settings']['router_env'])
+            self.router_envs[node] = router_env
+            self.graph.nodes[node]['router_env'] = router_env
+
+        # Линки не меняются во время симуляции (оборванный линк просто не
+        # используется роутерами), поэтому строятся один раз
+        for u, v, data in self.graph.edges(data=True):
+            self.router_envs[u].links[v] = Link(data['bandwidth'],
+                                                data['resource'],
+                                                self.router_envs[v])
+
+        # Если bootstrap, роутеры получают граф сети в InitMsg и не
+        # рассылают начальные анонсы
+        init_config = {}
+        if self.run_params['settings'].get('bootstrap', False):
+            init_config['topology'] = self.__topology()
 
-        for _, router in self.graph.nodes.data('router_env'):
-            router.receive(InitMsg({}))
+        for router_env in self.router_envs.values():
+            router_env.receive(InitMsg(init_config))
+
+    def close(self):
+        for router_env in self.router_envs.values():
+            router_env.handler.close()
+
+    # Вызвать fun(event) через delay единиц времени
+    def call_later(self, delay, fun):
+        self.env.timeout(delay).callbacks.append(fun)
+
+    def get_time(self):
+        return self.env.now
 
     def __copy_edge_data(self, u, v):
         data = self.graph.edges[u, v].copy()
         del data['resource']
         return data
 
+    # Граф сети без очередей линков, как его видят роутеры
+    def __topology(self) -> nx.DiGraph:
+        topology = nx.DiGraph()
+        for u, v in self.graph.edges:
+            topology.add_edge(u, v, **self.__copy_edge_data(u, v))
+
+        return topology
+
     def create_graph(self, run_params) -> nx.DiGraph:
         # Входящие и исходящие ребра создаются и обрываются парами в
         # компьютерной сети
@@ -155,55 +224,152 @@ class ComputerNetEnv(NetworkEnv):
         graph = nx.DiGraph()
         for edge in run_params['network']:
             u, v, params = parse_edge(edge)
-            graph.add_edge(
-                    u, v, resource=Resource(self.env, capacity=1), **params)
-            graph.add_edge(
-                    v, u, resource=Resource(self.env, capacity=1), **params)
+            graph.add_edge(u, v, resource=self.create_link_queue(), **params)
+            graph.add_edge(v, u, resource=self.create_link_queue(), **params)
 
         return graph
 
-    def run_process(self, random_seed=None):
-        if random_seed is not None:
-            set_random_seed(random_seed)
+    # Очередь передачи пакетов по линку
+    def create_link_queue(self):
+        return Resource(self.env, capacity=1)
 
-        pkg_distr = self.run_params['settings']['pkg_distr']
-        pkg_id = 1
-        for seq in pkg_distr:
+    def run_process(self, random_seed=None):
+        traffic = TrafficDriver(self, random_seed)
+
+        delay = traffic.step()
+        while delay is not None:
+            yield self.env.timeout(delay)
+            delay = traffic.step()
+
+    # Выполнить действие с линком в момент time (например, в продолжении
+    # симуляции из снимка)
+    def schedule_action(self, time, action, u, v):
+        if time < self.env.now:
+            raise ValueError(f'Action {action} ({u}, {v}) at time {time} '
+                             f'is in the past, now is {self.env.now}')
+
+        self.call_later(time - self.env.now,
+                        partial(self._scheduled_action, action, u, v))
+
+    def _scheduled_action(self, action, u, v, _=None):
+        self.link_action(action, u, v)
+
+    # Можно только обрывать и восстанавливать соединение. Добавлять новые
+    # нельзя.
+    def link_action(self, action, u, v):
+        if action == 'break_link':
+            self.router_envs[u].receive(RemoveLinkMsg(v))
+            self.router_envs[v].receive(RemoveLinkMsg(u))
+        elif action == 'restore_link':
+            self.router_envs[u].receive(AddLinkMsg(
+                    v, edge_data=self.__copy_edge_data(u, v)))
+            self.router_envs[v].receive(AddLinkMsg(
+                    u, edge_data=self.__copy_edge_data(v, u)))
+
+
+# Отправка трафика по pkg_distr или по расписанию из settings.traffic.
+# Каждый шаг выполняет то, что происходит в текущий момент, и возвращает
+# задержку до следующего шага (None -- трафик закончился). Состояние
+# хранится в полях, а не в генераторе, поэтому его можно сериализовать
+# вместе с симуляцией.
+class TrafficDriver:
+    def __init__(self, net_env: ComputerNetEnv, random_seed=None):
+        self.net_env = net_env
+        self.random_seed = random_seed
+        self.started = False
+        self.all_nodes = list(net_env.router_envs)
+
+        self.pkg_id = 1
+        # Прежний режим: позиция в pkg_distr
+        self.seq_idx = 0
+        self.pkg_idx = 0
+        # Режим расписания: следующие пакет и действие, текущая часть
+        # массивов пакетов
+        self.schedule = None
+        self.action_idx = 0
+        self.chunk = None
+        self.chunk_start = 0
+
+    def step(self):
+        if not self.started:
+            self.__start()
+
+        if self.schedule is not None:
+            return self.__schedule_step()
+
+        settings = self.net_env.run_params['settings']
+        pkg_distr = settings['pkg_distr']
+        while self.seq_idx < len(pkg_distr):
+            seq = pkg_distr[self.seq_idx]
             if 'action' in seq:
-                action = seq['action']
-                pause = seq['pause']
-                u = seq['u']
-                v = seq['v']
-
-                # Можно только обрывать и восстанавливать соединение. Добавлять
-                # новые нельзя.
-
-                if action == 'break_link':
-                    self.graph.nodes[u]['router_env'].receive(RemoveLinkMsg(v))
-                    self.graph.nodes[v]['router_env'].receive(RemoveLinkMsg(u))
-                elif action == 'restore_link':
-                    self.graph.nodes[u]['router_env'].receive(AddLinkMsg(
-                            v, edge_data=self.__copy_edge_data(u, v)))
-                    self.graph.nodes[v]['router_env'].receive(AddLinkMsg(
-                            u, edge_data=self.__copy_edge_data(v, u)))
-
-                yield self.env.timeout(pause)
-            else:
-                delta = seq['delay']
-                all_nodes = list(self.graph.nodes)
-                sources = seq.get('srcs', all_nodes)
-                dests = seq.get('dsts', all_nodes)
-
-                for i in range(0, seq['num']):
-                    src = random.choice(sources)
-                    dst = random.choice(dests)
-                    pkg = Package(pkg_id, self.run_params['settings']['pkg_size'], dst, self.env.now, None)
-
-                    logger.debug(
-                            (f'Sending random package #{pkg_id} from {src}'
-                             f'to {dst} at time {self.env.now}'))
-                    self.graph.nodes[src]['router_env'].receive(
-                            InMsg(-1, src, PkgMsg(pkg)))
-
-                    pkg_id += 1
-                    yield self.env.timeout(delta)
+                self.seq_idx += 1
+                self.net_env.link_action(seq['action'], seq['u'], seq['v'])
+                return seq['pause']
+
+            if self.pkg_idx < seq['num']:
+                src = random.choice(seq.get('srcs', self.all_nodes))
+                dst = random.choice(seq.get('dsts', self.all_nodes))
+
+                self.__send(src, dst, settings['pkg_size'])
+                self.pkg_idx += 1
+                return seq['delay']
+
+            self.seq_idx += 1
+            self.pkg_idx = 0
+
+        return None
+
+    def __start(self):
+        self.started = True
+
+        if self.random_seed is not None:
+            set_random_seed(self.random_seed)
+
+        # Расписание трафика может быть подготовлено заранее
+        settings = self.net_env.run_params['settings']
+        if 'traffic' in settings:
+            self.schedule = get_schedule(settings,
+                                         sorted(self.net_env.router_envs),
+                                         self.random_seed)
+
+    def __schedule_step(self):
+        now = self.net_env.env.now
+        actions = self.schedule.actions
+
+        while True:
+            # Действия выполняются перед пакетом со своим номером
+            if self.action_idx < len(actions) and \
+                    actions[self.action_idx][0] < self.pkg_id:
+                _, time, action, u, v = actions[self.action_idx]
+                if time > now:
+                    return time - now
+
+                self.net_env.link_action(action, u, v)
+                self.action_idx += 1
+                continue
+
+            i = self.pkg_id - 1 - self.chunk_start
+            if self.chunk is None or i == len(self.chunk[0]):
+                if self.pkg_id > len(self.schedule):
+                    return None
+
+                self.chunk_start = self.pkg_id - 1
+                self.chunk = self.schedule.lists(self.chunk_start)
+                i = 0
+
+            times, srcs, dsts, sizes = self.chunk
+            if times[i] > now:
+                return times[i] - now
+
+            self.__send(srcs[i], dsts[i], sizes[i])
+
+    def __send(self, src, dst, size):
+        net_env = self.net_env
+        pkg = Package(self.pkg_id, size, dst, net_env.env.now, None)
+
+        logger.debug(
+                (f'Sending random package #{self.pkg_id} from {src}'
+                 f'to {dst} at time {net_env.env.now}'))
+        net_env.router_envs[src].receive(InMsg(-1, src, PkgMsg(pkg)))
+
+        self.pkg_id += 1
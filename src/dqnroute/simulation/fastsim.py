@@ -0,0 +1,278 @@
+import heapq
+import logging
+from collections import deque
+
+from .network import *
+from .compnet import *
+from ..messages import *
+from ..constants import *
+
+logger = logging.getLogger(MAIN_LOGGER)
+
+# Приоритеты событий, которые происходят в одно время (как в SimPy)
+URGENT = 0
+NORMAL = 1
+
+
+# Легковесное ядро симуляции. Событие -- это функция обратного вызова с
+# аргументом в куче. Порядок обработки такой же, как в SimPy: время,
+# приоритет, порядок планирования. Запланированы только события, которые
+# что-то делают, поэтому статистика доставки совпадает с ComputerNetEnv.
+class EventKernel:
+    def __init__(self):
+        self.now = 0
+        self.queue = []
+        self.eid = 0
+
+    # Количество обработанных событий
+    @property
+    def processed(self):
+        return self.eid - len(self.queue)
+
+    def schedule(self, callback, arg=None, priority=NORMAL, delay=0):
+        heapq.heappush(self.queue,
+                       (self.now + delay, priority, self.eid, callback, arg))
+        self.eid += 1
+
+    # Часть интерфейса simpy.Environment для процессов, которые ждут только
+    # таймауты (например, ComputerNetEnv.run_process)
+    def timeout(self, delay):
+        return delay
+
+    def process(self, generator):
+        self.schedule(self._resume, generator, URGENT)
+
+    def _resume(self, generator):
+        try:
+            delay = next(generator)
+        except StopIteration:
+            return
+
+        self.schedule(self._resume, generator, delay=delay)
+
+    # Обработать события. Если задано until, остановиться перед первым
+    # событием не раньше until, оставив его в очереди.
+    def run(self, until=None):
+        queue = self.queue
+        pop = heapq.heappop
+
+        if until is None:
+            while queue:
+                self.now, _, _, callback, arg = pop(queue)
+                callback(arg)
+            return
+
+        while queue and queue[0][0] < until:
+            self.now, _, _, callback, arg = pop(queue)
+            callback(arg)
+        self.now = max(self.now, until)
+
+
+# Очередь с одним обработчиком, аналог simpy.Resource(capacity=1)
+class KernelQueue:
+    def __init__(self, kernel: EventKernel):
+        self.kernel = kernel
+        self.busy = False
+        self.waiting = deque()
+
+    def request(self, callback, arg):
+        self.waiting.append((callback, arg))
+        self._trigger()
+
+    def release(self):
+        self.busy = False
+
+        # Ожидающий запрос получает доступ при обработке события
+        # освобождения. Если никто не ждет, событие ничего не делает.
+        if self.waiting:
+            self.kernel.schedule(self._trigger)
+
+    def _trigger(self, _=None):
+        if not self.busy and self.waiting:
+            self.busy = True
+            self.kernel.schedule(*self.waiting.popleft())
+
+
+# Окружение узла для EventKernel. Вместо событий SimPy msg_event принимает
+# продолжение done -- пару (callback, arg), которая планируется, когда
+# событие сообщения завершено.
+class KernelNodeEnv(Dispatcher):
+    def __init__(self, env: EventKernel, handler: MsgHandler):
+        self.env = env
+        self.handler = handler
+
+        self.delayed_msgs = {}
+
+    # Принять сообщение
+    def receive(self, msg: Message):
+        self.env.schedule(self._process_msg, msg, URGENT)
+
+    def _process_msg(self, msg: Message):
+        # Обработать сообщение, когда завершится его событие
+        self.msg_event(msg, (self._handle, msg))
+
+    def _handle(self, msg: Message):
+        for msg in self.handler.handle(msg):
+            self.msg_event(msg)
+
+    # Завершить событие
+    def _complete(self, done):
+        if done is not None:
+            self.env.schedule(*done)
+
+    def msg_event(self, msg: Message, done=None):
+        self.dispatch_tables['event'][msg.__class__](self, msg, done)
+
+    @handles('event', DelayedMsg)
+    def delayed_event(self, msg: DelayedMsg, done):
+        # Откладываем сообщение
+
+        self.env.schedule(self._delayed_event, (msg, done), URGENT)
+
+    @handles('event', InterruptDelayMsg)
+    def interrupt_event(self, msg: InterruptDelayMsg, done):
+        # Возобновляем обработку сообщения
+
+        delayed = self.delayed_msgs[msg.delay_id]
+        self.env.schedule(self._delay_expired, delayed, URGENT)
+        self._complete(done)
+
+    @handles('event', LoopbackMsg)
+    def loopback_event(self, msg: LoopbackMsg, done):
+        # Возвращаем сообщение роутеру
+
+        self.receive(msg.inner_msg)
+        self._complete(done)
+
+    def _delayed_event(self, delayed):
+        msg, _ = delayed
+        self.delayed_msgs[msg.id] = delayed
+        self.env.schedule(self._delay_expired, delayed, delay=msg.delay)
+
+    def _delay_expired(self, delayed):
+        msg, done = delayed
+        if self.delayed_msgs.get(msg.id) is not delayed:
+            return  # задержка была прервана
+
+        del self.delayed_msgs[msg.id]
+
+        inner_done = None if done is None else (self._complete, done)
+        self.msg_event(msg.inner_msg, inner_done)
+
+
+class KernelRouterEnv(KernelNodeEnv):
+    def __init__(self,
+                 env: EventKernel,
+                 router,
+                 node: int,
+                 deliv_periods: DelivPeriods,
+                 pkg_proc_delay: int,
+                 inference: InferenceService = None):
+        super().__init__(env, router)
+
+        self.id = node
+        self.deliv_periods = deliv_periods
+        self.pkg_proc_delay = pkg_proc_delay
+        self.inference = inference
+        self.links = {}
+
+        self.msg_proc_queue = KernelQueue(self.env)
+
+    @handles('event', InitMsg, AddLinkMsg, RemoveLinkMsg, HoldDownMsg)
+    def router_only_event(self, msg: Message, done):
+        self._complete(done)
+
+    @handles('event', OutMsg)
+    def out_event(self, msg: OutMsg, done):
+        self.env.schedule(self._edge_transfer, (msg, done), URGENT)
+
+    @handles('event', InMsg)
+    def in_event(self, msg: InMsg, done):
+        self.env.schedule(self._input_queue, (msg, done), URGENT)
+
+    @handles('event', PkgReceivedMsg)
+    def received_event(self, msg: PkgReceivedMsg, done):
+        logger.debug((f'Package #{msg.pkg.id} received '
+                      f'at node {self.id} at time {self.env.now}'))
+        self.deliv_periods.register(msg.pkg.start_time, self.env.now)
+        self._complete(done)
+
+    @handles('event', InferenceMsg)
+    def inference_event(self, msg: InferenceMsg, done):
+        self.inference.submit(msg, self)
+        self._complete(done)
+
+    def _edge_transfer(self, args):
+        msg, done = args
+        link = self.links[msg.to_node]
+        new_msg = InMsg(msg.from_node, msg.to_node, msg.inner_msg)
+        inner_msg = msg.inner_msg
+
+        # Сервисные сообщения не засоряют канал
+        if isinstance(inner_msg, ServiceMsg):
+            link.peer.receive(new_msg)
+            self._complete(done)
+        elif isinstance(inner_msg, PkgMsg):
+            logger.debug(f'Package #{inner_msg.pkg.id} hop: '
+                         f'{msg.from_node} -> {msg.to_node}')
+
+            link.resource.request(self._edge_granted, (link, new_msg, done))
+        else:
+            raise UnsupportedMsgType(inner_msg)
+
+    def _edge_granted(self, args):
+        link, new_msg, _ = args
+        pkg = new_msg.inner_msg.pkg
+        self.env.schedule(self._edge_transferred, args,
+                          delay=pkg.size / link.bandwidth)
+
+    def _edge_transferred(self, args):
+        link, new_msg, done = args
+        link.resource.release()
+        link.peer.receive(new_msg)
+        self._complete(done)
+
+    def _input_queue(self, args):
+        msg, done = args
+        inner_msg = msg.inner_msg
+
+        if isinstance(inner_msg, ServiceMsg):
+            self._complete(done)
+        elif isinstance(inner_msg, PkgMsg):
+            # Ждем обработки предыдущего сообщения
+            self.msg_proc_queue.request(self._proc_granted, args)
+        else:
+            raise UnsupportedMsgType(inner_msg)
+
+    def _proc_granted(self, args):
+        self.env.schedule(self._proc_done, args, delay=self.pkg_proc_delay)
+
+    def _proc_done(self, args):
+        _, done = args
+        self.msg_proc_queue.release()
+        self._complete(done)
+
+
+# Симуляция компьютерной сети на EventKernel
+class FastComputerNetEnv(ComputerNetEnv):
+    router_env_class = KernelRouterEnv
+
+    def create_env(self):
+        return EventKernel()
+
+    def create_link_queue(self):
+        return KernelQueue(self.env)
+
+    def call_later(self, delay, fun):
+        self.env.schedule(fun, delay=delay)
+
+    # Трафик отправляется обратными вызовами ядра, а не процессом-
+    # генератором, поэтому очередь событий можно сериализовать
+    def start(self, random_seed=None):
+        self.traffic = TrafficDriver(self, random_seed)
+        self.env.schedule(self._traffic_step, priority=URGENT)
+
+    def _traffic_step(self, _=None):
+        delay = self.traffic.step()
+        if delay is not None:
+            self.env.schedule(self._traffic_step, delay=delay)
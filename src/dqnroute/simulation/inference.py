@@ -0,0 +1,58 @@
+import torch as tch
+
+from ..messages import *
+from ..networks import forward_stacked
+
+
+# Пакетный расчет Q-оценок. Запросы всех роутеров, которые пришли в течение
+# окна, считаются одним прямым проходом на каждую архитектуру модели: у
+# роутеров свои дообучаемые копии весов, веса складываются в стопку
+# (forward_stacked).
+class InferenceService:
+    def __init__(self, call_later, window=0):
+        # Функция окружения для отложенного вызова: call_later(delay, fun)
+        self.call_later = call_later
+        self.window = window
+
+        self.pending = []
+
+    def submit(self, msg: InferenceMsg, router_env):
+        if not self.pending:
+            self.call_later(self.window, self.flush)
+
+        self.pending.append((msg, router_env))
+
+    def flush(self, _=None):
+        pending, self.pending = self.pending, []
+
+        # Запросы группируются по архитектуре, внутри -- по модели
+        groups = {}
+        for i, (msg, _) in enumerate(pending):
+            groups.setdefault(msg.model.label, {}).setdefault(
+                    id(msg.model), []).append(i)
+
+        preds = [None] * len(pending)
+        with tch.no_grad():
+            for by_model in groups.values():
+                models = [pending[idxs[0]][0].model
+                          for idxs in by_model.values()]
+                for model in models:
+                    if model.training:
+                        model.eval()
+
+                inputs = [tch.cat([pending[i][0].inputs for i in idxs])
+                          for idxs in by_model.values()]
+                outputs = forward_stacked(models, inputs)
+
+                for idxs, output in zip(by_model.values(), outputs):
+                    output = output.numpy()
+                    start = 0
+                    for i in idxs:
+                        end = start + len(pending[i][0].inputs)
+                        preds[i] = output[start:end]
+                        start = end
+
+        # Ответы отправляются в порядке запросов
+        for (msg, router_env), pred in zip(pending, preds):
+            for resp in msg.callback(pred):
+                router_env.msg_event(resp)
@@ -4,10 +4,11 @@ from simpy import Environment, Event, Interrupt
 from ..delivperiods import *
 from ..messages import *
 from ..agents import *
+from ..dispatch import *
 
 
-# Окружение узла
-class NodeEnv:
+# Окружение узла. Событие для сообщения выбирается по таблице 'event'.
+class NodeEnv(Dispatcher):
     def __init__(self, env: Environment, handler: MsgHandler):
         self.env = env
         self.handler = handler
@@ -34,17 +35,27 @@ class NodeEnv:
 
     # Получить событие для сообщения
     def msg_event(self, msg: Message) -> Event:
-        if isinstance(msg, DelayedMsg):
-            # Откладываем сообщение
+        return self.dispatch_tables['event'][msg.__class__](self, msg)
 
-            return self.env.process(self.__delayed_event(msg))
-        elif isinstance(msg, InterruptDelayMsg):
-            # Возобновляем обработку сообщения
+    @handles('event', DelayedMsg)
+    def delayed_event(self, msg: DelayedMsg) -> Event:
+        # Откладываем сообщение
 
-            self.delayed_msgs[msg.delay_id].interrupt()
-            return self.env.event().succeed()
-        else:
-            raise UnsupportedMsgType(msg)
+        return self.env.process(self.__delayed_event(msg))
+
+    @handles('event', InterruptDelayMsg)
+    def interrupt_event(self, msg: InterruptDelayMsg) -> Event:
+        # Возобновляем обработку сообщения
+
+        self.delayed_msgs[msg.delay_id].interrupt()
+        return self.env.event().succeed()
+
+    @handles('event', LoopbackMsg)
+    def loopback_event(self, msg: LoopbackMsg) -> Event:
+        # Возвращаем сообщение роутеру
+
+        self.receive(msg.inner_msg)
+        return self.env.event().succeed()
 
     def __delayed_event(self, msg):
         delay_event = self.env.timeout(msg.delay)
@@ -70,9 +81,12 @@ class NetworkEnv:
         self.router_type = router_type
         self.deliv_periods = deliv_periods
 
-        self.env = Environment()
+        self.env = self.create_env()
         self.graph = self.create_graph(run_params)
 
+    def create_env(self):
+        return Environment()
+
     def get_router_cfg(self, node):
         router_cfg = self.run_params['settings']['router'].get(
                 self.router_type, {})
@@ -86,8 +100,24 @@ class NetworkEnv:
         return router_cfg
 
     def run(self, random_seed=None):
+        self.start(random_seed)
+        self.finish()
+
+    # Запустить процесс генерации трафика. Симуляцию можно вести частями:
+    # start, затем run_until до нужного времени и finish.
+    def start(self, random_seed=None):
         self.env.process(self.run_process(random_seed))
+
+    def run_until(self, time):
+        self.env.run(until=time)
+
+    def finish(self):
         self.env.run()
+        self.close()
+
+    # Остановить роутеры после симуляции
+    def close(self):
+        pass
 
     def create_graph(self, run_params) -> nx.DiGraph:
         raise NotImplementedError()
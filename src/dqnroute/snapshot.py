@@ -0,0 +1,123 @@
+import os
+import sys
+import pickle
+import random
+import threading
+import traceback
+
+import numpy as np
+import torch
+
+from .simulation import EventKernel
+from .agents.training import BackgroundTraining
+
+# Снимки симуляции. Симуляция ведется до нужного момента (start,
+# run_until), после чего из нее можно продолжить несколько вариантов:
+# сериализовать снимок (snapshot/restore) или продолжить варианты в копиях
+# процесса (fork_variants). В снимок попадает все окружение: роутеры
+# (Q-таблицы, модели DQN с оптимизаторами и памятью, анонсы), очереди,
+# сообщения в пути, статистика доставки, а также состояние генераторов
+# случайных чисел.
+
+
+def rng_state():
+    return random.getstate(), np.random.get_state(), torch.get_rng_state()
+
+
+def set_rng_state(state):
+    py_state, np_state, torch_state = state
+    random.setstate(py_state)
+    np.random.set_state(np_state)
+    torch.set_rng_state(torch_state)
+
+
+# Сериализовать симуляцию. Очередь событий SimPy хранит генераторы,
+# поэтому сериализуется только симуляция на EventKernel. Фоновое обучение
+# DQN использует поток и блокировки, его состояние не сериализуется.
+def snapshot(net_env) -> bytes:
+    if not isinstance(net_env.env, EventKernel):
+        raise ValueError('Only EventKernel simulations can be serialized')
+
+    for node, router_env in net_env.router_envs.items():
+        training = getattr(router_env.handler, 'training', None)
+        if isinstance(training, BackgroundTraining):
+            raise ValueError(f'Router {node} uses background training, '
+                             f'which cannot be serialized')
+
+    return pickle.dumps((net_env, rng_state()),
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def restore(data: bytes):
+    net_env, state = pickle.loads(data)
+    set_rng_state(state)
+    return net_env
+
+
+# Вариант: действия с линками [{'time': ..., 'action': ..., 'u': ...,
+# 'v': ...}, ...], которые выполняются в продолжении симуляции. Вернуть
+# статистику доставки.
+def run_variant(net_env, actions):
+    for action in actions:
+        net_env.schedule_action(action['time'],
+                                action['action'],
+                                action['u'],
+                                action['v'])
+
+    net_env.finish()
+    return net_env.deliv_periods.get_periods()
+
+
+# Продолжить симуляцию в дочерних процессах (os.fork), по одному на
+# вариант, не больше processes одновременно. Процесс получает копию
+# симуляции в текущем состоянии, выполняет run(net_env, variant) и
+# передает результат родителю. Результаты возвращаются в порядке вариантов.
+def fork_variants(net_env, variants, run=run_variant, processes=None) -> list:
+    # Потоки (например, BackgroundTraining) не копируются в дочерний процесс
+    if threading.active_count() > 1:
+        raise RuntimeError('Cannot fork simulation with background threads')
+
+    processes = processes or os.cpu_count()
+    state = rng_state()
+    results = [None] * len(variants)
+    running = []
+
+    def collect():
+        pid, i, fd = running.pop(0)
+        with os.fdopen(fd, 'rb') as f:
+            ok, result = pickle.loads(f.read())
+        os.waitpid(pid, 0)
+
+        if not ok:
+            raise RuntimeError(f'Variant {i} failed:\n{result}')
+        results[i] = result
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    for i, variant in enumerate(variants):
+        if len(running) == processes:
+            collect()
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            # random заново инициализируется в дочернем процессе
+            set_rng_state(state)
+            try:
+                data = pickle.dumps((True, run(net_env, variant)))
+            except BaseException:
+                data = pickle.dumps((False, traceback.format_exc()))
+
+            with os.fdopen(write_fd, 'wb') as f:
+                f.write(data)
+            os._exit(0)
+
+        os.close(write_fd)
+        running.append((pid, i, read_fd))
+
+    while running:
+        collect()
+
+    return results
@@ -0,0 +1,205 @@
+import argparse
+
+import yaml
+import numpy as np
+import pandas as pd
+
+# Расписание трафика, подготовленное заранее: массивы времени отправки,
+# отправителя, получателя и размера пакетов, упорядоченные по времени, и
+# действия с линками. Окружение отправляет пакеты по массивам, не вызывая
+# генератор случайных чисел на каждый пакет.
+
+# Запись бинарного трейса (.npy)
+TRACE_DTYPE = np.dtype([('time', 'f8'),
+                        ('src', 'i8'),
+                        ('dst', 'i8'),
+                        ('size', 'f8')])
+
+
+class Schedule:
+    def __init__(self, times, srcs, dsts, sizes, actions=None):
+        self.times = times
+        self.srcs = srcs
+        self.dsts = dsts
+        self.sizes = sizes
+
+        # (номер пакета, время, действие, u, v): действие выполняется перед
+        # отправкой этого пакета
+        self.actions = actions if actions is not None else []
+
+    def __len__(self):
+        return len(self.times)
+
+    # Пакеты с номера start (не больше size): времена, отправители,
+    # получатели и размеры списками. Трейс читается частями и не
+    # загружается в память целиком.
+    def lists(self, start, size=65536):
+        end = start + size
+        return (self.times[start:end].tolist(),
+                self.srcs[start:end].tolist(),
+                self.dsts[start:end].tolist(),
+                self.sizes[start:end].tolist())
+
+
+# Подготовить расписание по pkg_distr из файла запуска. У каждой группы
+# пакетов свой генератор, порожденный от seed, поэтому расписание не
+# зависит от глобального состояния random и одинаково во всех процессах.
+def compile_schedule(pkg_distr, nodes, pkg_size, seed=None) -> Schedule:
+    streams = np.random.SeedSequence(seed).spawn(len(pkg_distr))
+    all_nodes = np.array(nodes)
+
+    time = 0
+    parts = []
+    actions = []
+    pkgs_num = 0
+    for seq, stream in zip(pkg_distr, streams):
+        if 'action' in seq:
+            actions.append((pkgs_num, time, seq['action'], seq['u'], seq['v']))
+            time += seq['pause']
+            continue
+
+        rand = np.random.default_rng(stream)
+        num = seq['num']
+        sources = np.array(seq['srcs']) if 'srcs' in seq else all_nodes
+        dests = np.array(seq['dsts']) if 'dsts' in seq else all_nodes
+
+        parts.append((time + seq['delay'] * np.arange(num),
+                      rand.choice(sources, num),
+                      rand.choice(dests, num)))
+        time += seq['delay'] * num
+        pkgs_num += num
+
+    if parts:
+        times, srcs, dsts = (np.concatenate(arrs) for arrs in zip(*parts))
+    else:
+        times = np.zeros(0)
+        srcs = dsts = np.zeros(0, dtype=np.int64)
+
+    return Schedule(times.astype(float),
+                    srcs.astype(np.int64),
+                    dsts.astype(np.int64),
+                    np.full(len(times), float(pkg_size)),
+                    actions)
+
+
+# Загрузить записанный трейс: CSV со столбцами time, src, dst и
+# необязательным size или .npy с записями TRACE_DTYPE (отображается в
+# память). Трейс содержит только пакеты.
+def load_trace(path, nodes=None, pkg_size=None) -> Schedule:
+    if path.endswith('.npy'):
+        trace = np.load(path, mmap_mode='r')
+        times, srcs, dsts, sizes = (trace[name] for name in TRACE_DTYPE.names)
+    else:
+        trace = pd.read_csv(path)
+        times = trace['time'].to_numpy(dtype=float)
+        srcs = trace['src'].to_numpy(dtype=np.int64)
+        dsts = trace['dst'].to_numpy(dtype=np.int64)
+        if 'size' in trace:
+            sizes = trace['size'].to_numpy(dtype=float)
+        elif pkg_size is not None:
+            sizes = np.full(len(trace), float(pkg_size))
+        else:
+            raise ValueError('Trace has no packet sizes: ' + path)
+
+    if np.any(np.diff(times) < 0):
+        raise ValueError('Trace is not sorted by time: ' + path)
+
+    if nodes is not None:
+        for name, arr in [('src', srcs), ('dst', dsts)]:
+            unknown = np.setdiff1d(arr, nodes)
+            if len(unknown) > 0:
+                raise ValueError(f'Unknown {name} nodes in trace {path}: '
+                                 f'{unknown[:10].tolist()}')
+
+    return Schedule(times, srcs, dsts, sizes)
+
+
+def save_trace(schedule: Schedule, path):
+    if path.endswith('.npy'):
+        trace = np.empty(len(schedule), dtype=TRACE_DTYPE)
+        trace['time'] = schedule.times
+        trace['src'] = schedule.srcs
+        trace['dst'] = schedule.dsts
+        trace['size'] = schedule.sizes
+        np.save(path, trace)
+    else:
+        pd.DataFrame({'time': schedule.times,
+                      'src': schedule.srcs,
+                      'dst': schedule.dsts,
+                      'size': schedule.sizes}).to_csv(path, index=False)
+
+
+def compiled_schedule(settings, nodes, seed) -> Schedule:
+    return compile_schedule(settings['pkg_distr'],
+                            nodes,
+                            settings['pkg_size'],
+                            seed)
+
+
+# Действия с линками из pkg_distr: (время, действие, u, v)
+def link_actions(pkg_distr) -> list:
+    time = 0
+    actions = []
+    for seq in pkg_distr:
+        if 'action' in seq:
+            actions.append((time, seq['action'], seq['u'], seq['v']))
+            time += seq['pause']
+        else:
+            time += seq['delay'] * seq['num']
+
+    return actions
+
+
+# Пакеты из трейса, действия с линками из pkg_distr файла запуска. Действие
+# выполняется перед первым пакетом, отправленным не раньше него, как и в
+# расписании, подготовленном по pkg_distr.
+def trace_schedule(settings, nodes, seed, path) -> Schedule:
+    schedule = load_trace(path, nodes, settings['pkg_size'])
+
+    actions = link_actions(settings.get('pkg_distr', []))
+    indices = np.searchsorted(schedule.times, [a[0] for a in actions])
+    schedule.actions = [(int(i),) + action
+                        for i, action in zip(indices, actions)]
+    return schedule
+
+
+__schedule_fns = {
+    'compiled': compiled_schedule,
+    'trace': trace_schedule
+}
+
+
+# Расписание по настройке settings.traffic: {'mode': 'compiled'} или
+# {'mode': 'trace', 'path': ...}
+def get_schedule(settings, nodes, seed=None) -> Schedule:
+    traffic = settings['traffic']
+    params = {k: v for k, v in traffic.items() if k != 'mode'}
+    return __schedule_fns[traffic['mode']](settings, nodes, seed, **params)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compile pkg_distr of a launch file into a traffic trace')
+    parser.add_argument('launch', type=str, help='Path to launch file')
+    parser.add_argument('output', type=str, help='Path to .npy or .csv trace')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with open(args.launch) as f:
+        run_params = yaml.safe_load(f)
+
+    nodes = sorted({edge[k] for edge in run_params['network']
+                    for k in ('u', 'v')})
+    settings = run_params['settings']
+    schedule = compile_schedule(settings['pkg_distr'],
+                                nodes,
+                                settings['pkg_size'],
+                                args.seed)
+    save_trace(schedule, args.output)
+
+    print(f'{len(schedule)} packets, {len(schedule.actions)} link actions '
+          f'(not saved in trace, replayed from pkg_distr)')
+
+
+if __name__ == '__main__':
+    main()
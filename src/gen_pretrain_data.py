@@ -2,10 +2,12 @@ import os
 import argparse
 
 import yaml
+import numpy as np
 import networkx as nx
 import pandas as pd
 
 from dqnroute.utils import *
+from dqnroute.pretraindata import *
 
 seed = 41
 
@@ -37,11 +39,163 @@ def parse_actions(nodes, pkg_distr):
             raise Exception('Unexpected action: ' + action)
 
 
+# Топология сети между изменениями линков. Кратчайшие пути считаются один
+# раз, строки для пакета собираются из готовых блоков.
+class Epoch:
+    def __init__(self, net_graph, topology):
+        self.net_graph = net_graph
+        self.topology = topology
+
+        # Расстояния считаются от каждого соседа, как в dijkstra_path_length
+        self.dists, self.paths = {}, {}
+        for node, (dists, paths) in nx.all_pairs_dijkstra(net_graph):
+            self.dists[node] = dists
+            self.paths[node] = paths
+
+        self.hop_blocks = {}
+        self.pkg_blocks = {}
+
+    # Строки [dst, cur, nbr, -estim] для каждого соседа текущего узла
+    def hop_block(self, cur_node, dst_node):
+        key = cur_node, dst_node
+        if key not in self.hop_blocks:
+            rows = []
+            for nbr_node in self.net_graph.neighbors(cur_node):
+                # Оценить время доставки через каждого соседа
+                if dst_node in self.dists[nbr_node]:
+                    estim = self.net_graph.edges[cur_node, nbr_node]['weight']
+                    estim += self.dists[nbr_node][dst_node]
+                else:
+                    estim = -INFTY
+
+                rows.append([dst_node, cur_node, nbr_node, -estim])
+
+            self.hop_blocks[key] = np.array(rows, dtype=float).reshape(-1, 4)
+
+        return self.hop_blocks[key]
+
+    # Строки для всех узлов кратчайшего пути
+    def pkg_block(self, src_node, dst_node):
+        key = src_node, dst_node
+        if key not in self.pkg_blocks:
+            if dst_node not in self.paths[src_node]:
+                raise nx.NetworkXNoPath(f'No path to {dst_node}.')
+
+            path = self.paths[src_node][dst_node]
+            self.pkg_blocks[key] = np.concatenate(
+                    [self.hop_block(cur_node, dst_node) for cur_node in path])
+
+        return self.pkg_blocks[key]
+
+
+# Запись строк на диск частями
+class ChunkWriter:
+    def __init__(self, chunk_rows):
+        self.chunk_rows = chunk_rows
+
+        self.blocks = []
+        self.size = 0
+
+    def add(self, pkg_id, block, topology):
+        self.blocks.append((pkg_id, block, topology))
+        self.size += len(block)
+        if self.size >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.blocks:
+            self.write()
+
+        self.blocks = []
+        self.size = 0
+
+    def close(self):
+        self.flush()
+
+    def write(self):
+        raise NotImplementedError()
+
+
+# CSV, в каждой строке матрица смежности в столбцах amatrix_*
+class CSVWriter(ChunkWriter):
+    def __init__(self, path, nodes, chunk_rows):
+        super().__init__(chunk_rows)
+
+        self.file = open(path, 'w')
+
+        amatrix_cols = get_multi_col('amatrix', len(nodes)**2)
+        self.columns = ['dst', 'src', 'pkg_id', 'nbr'] + amatrix_cols + \
+            ['estim']
+        self.amatrices = []
+        self.written = 0
+
+    def add_topology(self, amatrix):
+        self.amatrices.append(amatrix)
+        return len(self.amatrices) - 1
+
+    def write(self):
+        data = np.empty((self.size, len(self.columns)))
+        start = 0
+        for pkg_id, block, topology in self.blocks:
+            end = start + len(block)
+            data[start:end, 0:2] = block[:, 0:2]  # dst, src
+            data[start:end, 2] = pkg_id
+            data[start:end, 3] = block[:, 2]  # nbr
+            data[start:end, 4:-1] = self.amatrices[topology]
+            data[start:end, -1] = block[:, 3]  # estim
+            start = end
+
+        df = pd.DataFrame(data,
+                          columns=self.columns,
+                          index=pd.RangeIndex(self.written,
+                                              self.written + self.size))
+        df.to_csv(self.file, header=self.written == 0, index=True)
+
+        self.written += self.size
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+# Каталог в формате dqnroute.pretraindata
+class BinaryWriter(ChunkWriter):
+    def __init__(self, path, nodes, chunk_rows):
+        super().__init__(chunk_rows)
+
+        self.data_writer = PretrainDataWriter(path, nodes)
+
+    def add_topology(self, amatrix):
+        return self.data_writer.add_topology(amatrix)
+
+    def write(self):
+        samples = np.empty(self.size, dtype=SAMPLE_DTYPE)
+        start = 0
+        for pkg_id, block, topology in self.blocks:
+            end = start + len(block)
+            samples['dst'][start:end] = block[:, 0]
+            samples['src'][start:end] = block[:, 1]
+            samples['pkg_id'][start:end] = pkg_id
+            samples['nbr'][start:end] = block[:, 2]
+            samples['topology'][start:end] = topology
+            samples['estim'][start:end] = block[:, 3]
+            start = end
+
+        self.data_writer.add(samples)
+
+    def close(self):
+        super().close()
+        self.data_writer.close()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Pre-training dataset generator')
     parser.add_argument('launch', type=str, help='Path to launch file')
-    parser.add_argument('output', type=str, help='Path to results .csv')
+    parser.add_argument('output', type=str,
+                        help='Path to results: .csv file or data directory')
+    parser.add_argument('--chunk-rows', type=int, default=100000,
+                        help='Rows written to disk at once')
     args = parser.parse_args()
 
     # Загрузить настройки
@@ -63,58 +217,47 @@ def main():
 
     links_data = {}
 
-    amatrix_cols = get_multi_col('amatrix', len(net_graph)**2)
-    data_cols = ['dst', 'src', 'pkg_id', 'nbr'] + amatrix_cols + ['estim']
-    df = pd.DataFrame(columns=data_cols)
-
     def get_amatrix(net_graph):
         # В матрице смежности узлы упорядочены
         # Во время обучения модели эмбеддинги обучаются по матрице смежности,
         # поэтому важно включить информацию о весах
-        return list(nx.to_numpy_array(
+        return nx.to_numpy_array(
                 net_graph,
                 weight='weight',
-                nodelist=sorted(net_graph.nodes())).flatten())
+                nodelist=sorted(net_graph.nodes())).flatten()
+
+    # CSV можно загрузить в pandas, каталог -- через load_pretrain_data
+    Writer = CSVWriter if args.output.endswith('.csv') else BinaryWriter
+    writer = Writer(args.output, list(net_graph), args.chunk_rows)
+
+    # Строки ссылаются на матрицу смежности своей топологии по номеру
+    def new_epoch():
+        return Epoch(net_graph, writer.add_topology(get_amatrix(net_graph)))
 
-    amatrix = get_amatrix(net_graph)
+    epoch = new_epoch()
 
     for action, params in parse_actions(list(net_graph),
                                         settings['pkg_distr']):
         if action == 'send_pkg':
+            # По кратчайшему пути оценить время доставки через каждого
+            # соседа
             pkg_id, src_node, dst_node = params
-            for cur_node in nx.dijkstra_path(net_graph, src_node, dst_node):
-                # По кратчайшему пути
-
-                for nbr_node in list(net_graph.neighbors(cur_node)):
-                    # Оценить время доставки через каждого соседа
-
-                    # Получить состояние
-                    state = [dst_node, cur_node, pkg_id, nbr_node] + amatrix
-
-                    # Получить целевое значение
-                    try:
-                        estim = net_graph.edges[cur_node, nbr_node]['weight']
-                        estim += nx.dijkstra_path_length(net_graph,
-                                                         nbr_node,
-                                                         dst_node)
-                    except nx.exception.NetworkXNoPath:
-                        estim = -INFTY
-
-                    # Записать объект
-                    df.loc[len(df)] = state + [-estim]
+            writer.add(pkg_id,
+                       epoch.pkg_block(src_node, dst_node),
+                       epoch.topology)
         elif action == 'break_link':
             u, v = params
             links_data[(u, v)] = net_graph[u][v]
             net_graph.remove_edge(u, v)
-            amatrix = get_amatrix(net_graph)
+            epoch = new_epoch()
         elif action == 'restore_link':
             u, v = params
             net_graph.add_edge(u, v, **links_data.pop((u, v)))
-            amatrix = get_amatrix(net_graph)
+            epoch = new_epoch()
         else:
             raise Exception('Unexpected action: ' + action)
 
-    df.to_csv(args.output, mode='w', header=True, index=True)
+    writer.close()
 
 
 if __name__ == '__main__':
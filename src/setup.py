@@ -13,5 +13,13 @@ setup(
         'numpy>=1.15.3',
         'pyyaml>=4.2b1',
         'torch>=1.0.1'
-    )
+    ),
+    entry_points={
+        'console_scripts': [
+            'dqnroute-pretrain=dqnroute.pretrain:main',
+            'dqnroute-run=dqnroute.runner:main',
+            'dqnroute-scenario=dqnroute.scenarios:main',
+            'dqnroute-traffic=dqnroute.traffic:main'
+        ]
+    }
 )